@@ -2,10 +2,17 @@
 
 import reflex as rx
 from .pages import login, signup, chat
+from .services.http_client import http_client_lifespan
+from .services.images import image_pool_lifespan
+from .services.metrics import metrics_api
 
 
-# Create the app
-app = rx.App()
+# Create the app (Prometheus metrics served at /metrics on the backend port)
+app = rx.App(api_transformer=metrics_api)
+
+# Close pooled upstream connections and image workers on shutdown
+app.register_lifespan_task(http_client_lifespan)
+app.register_lifespan_task(image_pool_lifespan)
 
 # Add pages
 app.add_page(
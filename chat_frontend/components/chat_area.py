@@ -1,8 +1,9 @@
 """Main chat area with messages and input."""
 
 import reflex as rx
-from ..state.chat_state import ChatState
+from ..state.chat_state import MESSAGE_LIST_ID, ChatState
 from .message_bubble import message_bubble
+from .virtual_list import virtual_message_list
 
 
 def chat_header() -> rx.Component:
@@ -55,7 +56,8 @@ def chat_header() -> rx.Component:
         rx.hstack(
             rx.button(
                 rx.icon("search", size=18),
-                variant="ghost",
+                on_click=ChatState.toggle_message_search,
+                variant=rx.cond(ChatState.show_message_search, "soft", "ghost"),
                 size="2",
             ),
             rx.button(
@@ -69,18 +71,105 @@ def chat_header() -> rx.Component:
     )
 
 
+def message_search_result(result: rx.Var) -> rx.Component:
+    """One message search result; clicking it jumps to the message."""
+    return rx.box(
+        rx.hstack(
+            rx.text(result["user"], weight="medium", size="1"),
+            rx.text(result["timestamp"], size="1", class_name="text-gray-500"),
+            rx.cond(
+                ~result["loaded"].to(bool),
+                rx.badge("Older", size="1", variant="soft", color_scheme="gray"),
+            ),
+            spacing="2",
+            align="center",
+        ),
+        rx.text(
+            result["before"],
+            rx.el.mark(result["match"], class_name="bg-yellow-200 dark:bg-yellow-700 rounded-sm"),
+            result["after"],
+            size="2",
+            class_name="text-gray-700 dark:text-gray-300 break-words",
+        ),
+        on_click=ChatState.jump_to_message(result["id"]),
+        class_name="w-full px-4 py-2 cursor-pointer hover:bg-gray-100 dark:hover:bg-gray-700",
+    )
+
+
+def message_search_panel() -> rx.Component:
+    """Search box and results for the open room's messages."""
+    return rx.cond(
+        ChatState.show_message_search,
+        rx.vstack(
+            rx.hstack(
+                rx.input(
+                    placeholder="Search messages...",
+                    value=ChatState.message_search_query,
+                    on_change=ChatState.set_message_search_query,
+                    auto_focus=True,
+                    size="2",
+                    class_name="flex-1",
+                ),
+                rx.cond(ChatState.message_search_loading, rx.spinner(size="2")),
+                rx.button(
+                    rx.icon("x", size=18),
+                    on_click=ChatState.toggle_message_search,
+                    variant="ghost",
+                    size="2",
+                ),
+                spacing="2",
+                align="center",
+                class_name="w-full px-4 pt-3",
+            ),
+            rx.cond(
+                ChatState.message_search_query != "",
+                rx.cond(
+                    ChatState.message_search_results.length() > 0,
+                    rx.vstack(
+                        rx.foreach(ChatState.message_search_results, message_search_result),
+                        spacing="0",
+                        class_name="w-full max-h-64 overflow-y-auto",
+                    ),
+                    rx.cond(
+                        ~ChatState.message_search_loading,
+                        rx.text(
+                            "No matching messages",
+                            size="2",
+                            class_name="text-gray-500 px-4",
+                        ),
+                    ),
+                ),
+            ),
+            spacing="2",
+            class_name="w-full pb-3 border-b border-gray-200 dark:border-gray-700 bg-white dark:bg-gray-800",
+        ),
+    )
+
+
 def message_list() -> rx.Component:
     """Scrollable message list."""
     return rx.box(
         rx.cond(
-            ChatState.messages.length() > 0,
-            rx.vstack(
-                rx.foreach(
-                    ChatState.messages,
-                    message_bubble,
+            (ChatState.message_history.length() + ChatState.message_tail.length()) > 0,
+            # Only rows near the viewport are mounted
+            virtual_message_list(
+                ChatState.message_history.to(list) + ChatState.message_tail,
+                lambda message: rx.box(
+                    message_bubble(message),
+                    # Search result jumped to
+                    class_name=rx.cond(
+                        ChatState.highlighted_message_id == message["id"].to(str),
+                        "py-2 bg-yellow-100 dark:bg-yellow-900/30 transition-colors",
+                        "py-2 transition-colors",
+                    ),
                 ),
-                spacing="4",
-                class_name="w-full p-4",
+                first_item_index=ChatState.first_message_index,
+                on_start_reached=ChatState.load_older_messages,
+                # Remount per room so each room opens at its latest message
+                key=ChatState.current_room_id,
+                # Gives search a handle for scrollToIndex
+                id=MESSAGE_LIST_ID,
+                class_name="h-full",
             ),
             # Empty state
             rx.center(
@@ -103,8 +192,16 @@ def message_list() -> rx.Component:
                 class_name="h-full",
             ),
         ),
+        # Loading older history
+        rx.cond(
+            ChatState.loading_older_messages,
+            rx.center(
+                rx.spinner(size="2"),
+                class_name="absolute top-2 inset-x-0 pointer-events-none",
+            ),
+        ),
         id="message-list",
-        class_name="flex-1 overflow-y-auto bg-gray-50 dark:bg-gray-900",
+        class_name="relative flex-1 min-h-0 w-full overflow-hidden bg-gray-50 dark:bg-gray-900",
     )
 
 
@@ -114,7 +211,7 @@ def typing_indicator() -> rx.Component:
         ChatState.typing_users.length() > 0,
         rx.hstack(
             rx.text(
-                f"{ChatState.typing_users[0]} is typing",
+                ChatState.typing_label,
                 size="1",
                 class_name="text-gray-500 italic",
             ),
@@ -171,6 +268,7 @@ def chat_area() -> rx.Component:
         # Chat selected
         rx.vstack(
             chat_header(),
+            message_search_panel(),
             message_list(),
             typing_indicator(),
             message_input(),
@@ -4,14 +4,22 @@ import reflex as rx
 from ..state.chat_state import ChatState
 
 
-def message_status_indicator(status: str, is_read: bool) -> rx.Component:
-    """Show message status icon."""
+def message_status_indicator(status: str, is_read: bool, message_id) -> rx.Component:
+    """Show message status icon (failed messages can be retried by clicking it)."""
     return rx.cond(
         status == "sending",
         rx.spinner(size="1", class_name="text-gray-400"),
         rx.cond(
             status == "failed",
-            rx.icon("circle-alert", size=14, class_name="text-red-500"),
+            rx.tooltip(
+                rx.icon(
+                    "circle-alert",
+                    size=14,
+                    class_name="text-red-500 cursor-pointer",
+                    on_click=lambda: ChatState.retry_message(message_id),
+                ),
+                content="Not sent. Click to retry",
+            ),
             rx.cond(
                 is_read,
                 rx.icon("check-check", size=14, class_name="text-blue-500"),
@@ -62,6 +70,8 @@ def message_bubble(message: dict) -> rx.Component:
                             message_status_indicator(
                                 message.get("status", "sent"),
                                 message.get("is_read", False)
+                                | ChatState.read_message_ids.contains(message["id"]),
+                                message["id"],
                             ),
                             spacing="1",
                             class_name="mt-1 items-center",
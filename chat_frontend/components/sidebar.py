@@ -4,8 +4,15 @@ import reflex as rx
 from ..state.chat_state import ChatState
 
 
-def room_item(room: dict) -> rx.Component:
-    """Individual room list item."""
+def room_item(room: dict, ordered: bool = False) -> rx.Component:
+    """
+    Individual room list item.
+    
+    Args:
+        room: Room var
+        ordered: Position the item by its activity rank (CSS order)
+    """
+    activity = ChatState.room_activity[room["id"].to(str)]
     return rx.box(
         rx.hstack(
             rx.avatar(
@@ -24,9 +31,9 @@ def room_item(room: dict) -> rx.Component:
                     ),
                     rx.spacer(),
                     rx.cond(
-                        room.get("unread_count", 0) > 0,
+                        activity["unread_count"].to(int) > 0,
                         rx.badge(
-                            str(room.get("unread_count", 0)),
+                            activity["unread_count"].to(str),
                             color_scheme="red",
                             size="1",
                         ),
@@ -34,7 +41,7 @@ def room_item(room: dict) -> rx.Component:
                     class_name="w-full",
                 ),
                 rx.text(
-                    room.get("last_message", "No messages yet"),
+                    activity["last_message"],
                     size="1",
                     class_name="text-gray-500 truncate w-full",
                 ),
@@ -50,6 +57,7 @@ def room_item(room: dict) -> rx.Component:
             "p-3 cursor-pointer rounded-lg bg-red-50 dark:bg-red-900/20 border border-red-200 dark:border-red-800",
             "p-3 cursor-pointer rounded-lg hover:bg-gray-100 dark:hover:bg-gray-800 transition-colors",
         ),
+        style={"order": activity["rank"]} if ordered else {},
     )
 
 
@@ -155,26 +163,43 @@ def sidebar() -> rx.Component:
         # Room List
         rx.vstack(
             rx.cond(
-                ChatState.rooms.length() > 0,
-                rx.foreach(
-                    ChatState.rooms,
-                    room_item,
-                ),
-                # Empty state
-                rx.vstack(
-                    rx.icon("message_circle", size=48, class_name="text-gray-400"),
-                    rx.text(
-                        "No chats yet",
-                        weight="500",
-                        class_name="text-gray-500",
+                ChatState.search_query != "",
+                # Search results
+                rx.cond(
+                    ChatState.filtered_rooms.length() > 0,
+                    rx.foreach(
+                        ChatState.filtered_rooms,
+                        room_item,
                     ),
                     rx.text(
-                        "Start a conversation",
-                        size="1",
-                        class_name="text-gray-400 text-center",
+                        "No matching chats",
+                        size="2",
+                        class_name="text-gray-500 text-center py-8",
+                    ),
+                ),
+                rx.cond(
+                    ChatState.rooms.length() > 0,
+                    # Most recently active first, without re-sorting `rooms`
+                    rx.foreach(
+                        ChatState.rooms,
+                        lambda room: room_item(room, ordered=True),
+                    ),
+                    # Empty state
+                    rx.vstack(
+                        rx.icon("message_circle", size=48, class_name="text-gray-400"),
+                        rx.text(
+                            "No chats yet",
+                            weight="500",
+                            class_name="text-gray-500",
+                        ),
+                        rx.text(
+                            "Start a conversation",
+                            size="1",
+                            class_name="text-gray-400 text-center",
+                        ),
+                        spacing="2",
+                        class_name="items-center py-12",
                     ),
-                    spacing="2",
-                    class_name="items-center py-12",
                 ),
             ),
             spacing="2",
@@ -0,0 +1,95 @@
+"""Windowed message list backed by react-virtuoso."""
+
+from typing import Any, Callable
+
+import reflex as rx
+from reflex.components.component import Component
+from reflex.event import no_args_event_spec
+from reflex.vars.base import Var
+from reflex.vars.function import ArgsFunctionOperation
+
+# Pixels rendered above and below the viewport
+OVERSCAN_PX = 600
+
+
+class Virtuoso(rx.Component):
+    """
+    Virtualized list that only mounts rows near the viewport.
+
+    Rows are measured after render, so variable heights (markdown, images
+    that load later) are handled without fixed row sizes.
+    """
+
+    library = "react-virtuoso@4.12.3"
+    tag = "Virtuoso"
+
+    # Items to render
+    data: Var[list]
+
+    # (index, item) => element
+    item_content: Var[Any]
+
+    # (index, item) => stable React key
+    compute_item_key: Var[Any]
+
+    # Absolute index of the first item; decrease it when prepending items
+    first_item_index: Var[int]
+
+    # Item shown at the top on first render, e.g. {"index": "LAST"}
+    initial_top_most_item_index: Var[Any]
+
+    # Auto-scroll when items are appended: "smooth", "auto", false or a function
+    follow_output: Var[Any]
+
+    # Keep short lists pinned to the bottom of the viewport
+    align_to_bottom: Var[bool]
+
+    # Extra pixels rendered outside the viewport
+    increase_viewport_by: Var[Any]
+
+    # Fired when the list is scrolled to the first item
+    start_reached: rx.EventHandler[no_args_event_spec]
+
+
+def virtual_message_list(
+    data: Var,
+    render_item: Callable[[Var], Component],
+    first_item_index: Var,
+    on_start_reached: Any = None,
+    **props,
+) -> Component:
+    """
+    Render `data` through a virtualized list.
+
+    Args:
+        data: List var of dicts with an "id" key
+        render_item: Builds the row component from the item var
+        first_item_index: Absolute index of data[0] (see Virtuoso.first_item_index)
+        on_start_reached: Event fired when the top of the list is reached
+        **props: Extra props for the Virtuoso component
+
+    Returns:
+        The list component
+    """
+    item = Var("item").to(dict)
+    item_content = ArgsFunctionOperation.create(
+        ("_index", "item"),
+        render_item(item),
+        _var_type=Component,
+    )
+
+    if on_start_reached is not None:
+        props["start_reached"] = on_start_reached
+
+    return Virtuoso.create(
+        data=data,
+        item_content=item_content,
+        compute_item_key=Var("(_index, item) => item.id"),
+        first_item_index=first_item_index,
+        initial_top_most_item_index={"index": "LAST"},
+        # Stick to the bottom for new messages only if the user is already there
+        follow_output=Var("(atBottom) => (atBottom ? 'smooth' : false)"),
+        align_to_bottom=True,
+        increase_viewport_by={"top": OVERSCAN_PX, "bottom": OVERSCAN_PX},
+        **props,
+    )
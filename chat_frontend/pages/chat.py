@@ -79,6 +79,6 @@ def chat_page() -> rx.Component:
             profile_modal(),
             
             class_name="w-full h-screen bg-gray-50 dark:bg-gray-900",
-            on_mount=[ChatState.check_auth, ChatState.load_rooms, ChatState.load_users],
+            on_mount=ChatState.bootstrap,
         ),
     )
\ No newline at end of file
@@ -0,0 +1,144 @@
+"""Per-endpoint circuit breakers and latency-derived timeouts."""
+
+import os
+import time
+from collections import deque
+from typing import Dict
+
+from .http_client import HTTP_TIMEOUT
+from .metrics import CIRCUIT_REJECTED, CIRCUIT_STATE, UPSTREAM_TIMEOUT
+
+# Consecutive failures (transport errors, timeouts, 5xx) that open a circuit
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5"))
+# Seconds an open circuit fails fast before letting a probe through
+BREAKER_RECOVERY_TIME = float(os.getenv("BREAKER_RECOVERY_TIME", "15"))
+# Concurrent probe requests allowed while half-open
+BREAKER_HALF_OPEN_PROBES = int(os.getenv("BREAKER_HALF_OPEN_PROBES", "1"))
+
+# Adaptive timeout: multiplier x latency percentile, clamped to [min, HTTP_TIMEOUT]
+TIMEOUT_PERCENTILE = float(os.getenv("TIMEOUT_PERCENTILE", "0.99"))
+TIMEOUT_MULTIPLIER = float(os.getenv("TIMEOUT_MULTIPLIER", "3"))
+TIMEOUT_MIN = float(os.getenv("TIMEOUT_MIN", "2"))
+TIMEOUT_MIN_SAMPLES = int(os.getenv("TIMEOUT_MIN_SAMPLES", "20"))
+LATENCY_WINDOW = int(os.getenv("LATENCY_WINDOW", "200"))
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an endpoint whose circuit is open."""
+    
+    def __init__(self, endpoint: str, retry_after: float):
+        self.endpoint = endpoint
+        self.retry_after = retry_after
+        super().__init__(f"Circuit open for {endpoint}, retry in {retry_after:.0f}s")
+
+
+class CircuitBreaker:
+    """
+    Closed/open/half-open breaker for one endpoint template.
+    
+    Also tracks recent successful latencies so requests get a timeout
+    proportional to how the endpoint normally behaves instead of a fixed
+    worst case.
+    """
+    
+    def __init__(self, endpoint: str):
+        self.endpoint = endpoint
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probes = 0
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+        self._timeout = HTTP_TIMEOUT
+        self._samples_since_timeout = 0
+        CIRCUIT_STATE.set(_STATE_VALUES[CLOSED], endpoint=endpoint)
+    
+    def before_request(self):
+        """
+        Admit a request or fail fast.
+        
+        Raises:
+            CircuitOpenError: If the circuit is open, or half-open with all
+                probe slots taken
+        """
+        if self.state == OPEN:
+            remaining = self.opened_at + BREAKER_RECOVERY_TIME - time.monotonic()
+            if remaining > 0:
+                CIRCUIT_REJECTED.inc(endpoint=self.endpoint)
+                raise CircuitOpenError(self.endpoint, remaining)
+            self._set_state(HALF_OPEN)
+        
+        if self.state == HALF_OPEN:
+            if self._probes >= BREAKER_HALF_OPEN_PROBES:
+                CIRCUIT_REJECTED.inc(endpoint=self.endpoint)
+                raise CircuitOpenError(self.endpoint, BREAKER_RECOVERY_TIME)
+            self._probes += 1
+    
+    def record_success(self, latency: float):
+        """Record a healthy response and its latency."""
+        self._latencies.append(latency)
+        self._samples_since_timeout += 1
+        self.failures = 0
+        if self.state == HALF_OPEN:
+            self._probes = max(0, self._probes - 1)
+            self._set_state(CLOSED)
+    
+    def release(self):
+        """Give back a probe slot for a request that ended without an outcome."""
+        if self.state == HALF_OPEN:
+            self._probes = max(0, self._probes - 1)
+    
+    def record_failure(self):
+        """Record a transport error, timeout or 5xx response."""
+        self.failures += 1
+        if self.state == HALF_OPEN:
+            self._probes = max(0, self._probes - 1)
+            self._open()
+        elif self.state == CLOSED and self.failures >= BREAKER_FAILURE_THRESHOLD:
+            self._open()
+    
+    def timeout(self) -> float:
+        """Current request timeout in seconds."""
+        if len(self._latencies) < TIMEOUT_MIN_SAMPLES:
+            return HTTP_TIMEOUT
+        
+        # Recompute every few samples rather than on every request
+        if self._samples_since_timeout >= 10 or self._timeout == HTTP_TIMEOUT:
+            ordered = sorted(self._latencies)
+            index = min(len(ordered) - 1, int(len(ordered) * TIMEOUT_PERCENTILE))
+            self._timeout = min(HTTP_TIMEOUT, max(TIMEOUT_MIN, ordered[index] * TIMEOUT_MULTIPLIER))
+            self._samples_since_timeout = 0
+            UPSTREAM_TIMEOUT.set(self._timeout, endpoint=self.endpoint)
+        return self._timeout
+    
+    def _open(self):
+        self.opened_at = time.monotonic()
+        self._set_state(OPEN)
+        print(f"Circuit opened for {self.endpoint} after {self.failures} failures")
+    
+    def _set_state(self, state: str):
+        self.state = state
+        CIRCUIT_STATE.set(_STATE_VALUES[state], endpoint=self.endpoint)
+
+
+class UpstreamGuard:
+    """Breakers keyed by endpoint template."""
+    
+    def __init__(self):
+        self._breakers: Dict[str, CircuitBreaker] = {}
+    
+    def breaker(self, endpoint: str) -> CircuitBreaker:
+        """Breaker for an endpoint template, created on first use."""
+        breaker = self._breakers.get(endpoint)
+        if breaker is None:
+            breaker = self._breakers[endpoint] = CircuitBreaker(endpoint)
+        return breaker
+
+
+# Worker-wide breakers
+upstream_guard = UpstreamGuard()
\ No newline at end of file
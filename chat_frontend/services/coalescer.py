@@ -0,0 +1,79 @@
+"""Coalesce identical in-flight requests into one upstream call."""
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+from .metrics import REGISTRY
+
+
+class _Flight:
+    """One upstream call and the number of callers sharing it."""
+    
+    __slots__ = ("task", "sharers")
+    
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.sharers = 1
+
+
+class RequestCoalescer:
+    """
+    Run at most one call per key at a time.
+    
+    Callers that arrive while a call for the same key is in flight await
+    its result instead of issuing their own.
+    """
+    
+    def __init__(self):
+        self._inflight: Dict[Hashable, _Flight] = {}
+        
+        # Counters
+        self.hits = 0
+        self.misses = 0
+    
+    async def run(self, key: Hashable, call: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """
+        Run `call` or join the in-flight call for `key`.
+        
+        Args:
+            key: Identity of the request (method, endpoint, params, auth scope)
+            call: Coroutine function performing the request
+        
+        Returns:
+            Tuple of the call's result and whether it was shared with other
+            callers (shared results must be copied before mutation)
+        """
+        flight = self._inflight.get(key)
+        if flight is None:
+            self.misses += 1
+            # Run detached so a cancelled caller does not cancel the others
+            flight = _Flight(asyncio.ensure_future(call()))
+            self._inflight[key] = flight
+            flight.task.add_done_callback(lambda _: self._finish(key, flight))
+        else:
+            self.hits += 1
+            flight.sharers += 1
+        
+        result = await asyncio.shield(flight.task)
+        return result, flight.sharers > 1
+    
+    def stats(self) -> Dict[str, int]:
+        """Return coalescing counters."""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "in_flight": len(self._inflight),
+        }
+    
+    def _finish(self, key: Hashable, flight: _Flight):
+        """Forget a completed call so later requests go upstream again."""
+        if self._inflight.get(key) is flight:
+            del self._inflight[key]
+        # Mark errors as retrieved even if every caller was cancelled
+        if not flight.task.cancelled():
+            flight.task.exception()
+
+
+# Worker-wide coalescer for GET requests
+request_coalescer = RequestCoalescer()
+REGISTRY.register_collector("chat_request_coalescer", request_coalescer.stats)
\ No newline at end of file
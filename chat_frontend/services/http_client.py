@@ -0,0 +1,77 @@
+"""Shared, pooled HTTP client for upstream API calls."""
+
+import contextlib
+import importlib.util
+import os
+from typing import Optional
+
+import httpx
+from dotenv import load_dotenv
+
+load_dotenv()
+
+API_URL = os.getenv("API_URL", "http://127.0.0.1:8020")
+
+# Pool configuration (per worker process)
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "30"))
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+HTTP2_ENABLED = os.getenv("HTTP2_ENABLED", "false").lower() in ("1", "true", "yes")
+
+_client: Optional[httpx.AsyncClient] = None
+_client_pid: Optional[int] = None
+
+
+def _http2_available() -> bool:
+    """HTTP/2 needs the optional `h2` package (pip install httpx[http2])."""
+    return importlib.util.find_spec("h2") is not None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """
+    Return the worker-wide HTTP client, creating it on first use.
+    
+    The client is recreated after a fork so that worker processes never
+    share sockets inherited from their parent.
+    """
+    global _client, _client_pid
+    
+    if _client is None or _client.is_closed or _client_pid != os.getpid():
+        http2 = HTTP2_ENABLED and _http2_available()
+        if HTTP2_ENABLED and not http2:
+            print("HTTP2_ENABLED is set but 'h2' is not installed, using HTTP/1.1")
+        
+        _client = httpx.AsyncClient(
+            base_url=API_URL,
+            timeout=HTTP_TIMEOUT,
+            limits=httpx.Limits(
+                max_connections=HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+            ),
+            http2=http2,
+        )
+        _client_pid = os.getpid()
+    
+    return _client
+
+
+async def close_http_client():
+    """Close the shared client and release its pooled connections."""
+    global _client, _client_pid
+    
+    if _client is not None and not _client.is_closed and _client_pid == os.getpid():
+        await _client.aclose()
+    
+    _client = None
+    _client_pid = None
+
+
+@contextlib.asynccontextmanager
+async def http_client_lifespan():
+    """Reflex lifespan task that closes the shared client on shutdown."""
+    try:
+        yield
+    finally:
+        await close_http_client()
\ No newline at end of file
@@ -0,0 +1,154 @@
+"""Avatar downscaling and re-encoding in a worker process pool."""
+
+import asyncio
+import contextlib
+import io
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Tuple
+
+from .metrics import IMAGE_BYTES_SAVED, IMAGE_PROCESS_LATENCY
+
+try:
+    from PIL import Image, ImageOps, features
+except ImportError:  # Pillow is optional; avatars are uploaded unchanged without it
+    Image = None
+
+# Longest edge of the stored avatar, in pixels
+AVATAR_SIZE = int(os.getenv("AVATAR_SIZE", "512"))
+# WEBP or JPEG (WEBP falls back to JPEG if Pillow lacks WebP support; other
+# values fall back to WEBP)
+AVATAR_FORMAT = os.getenv("AVATAR_FORMAT", "WEBP").upper()
+AVATAR_QUALITY = int(os.getenv("AVATAR_QUALITY", "85"))
+# Largest raw image accepted for processing
+IMAGE_MAX_INPUT_BYTES = int(os.getenv("IMAGE_MAX_INPUT_BYTES", str(25 * 1024 * 1024)))
+# Largest image decoded, in pixels; defaults to 16 times the avatar edge
+# (8192x8192 for 512px avatars), which bounds a decompression bomb's memory
+IMAGE_MAX_PIXELS = int(os.getenv("IMAGE_MAX_PIXELS", str((AVATAR_SIZE * 16) ** 2)))
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", "2"))
+
+_MIME_TYPES = {"WEBP": "image/webp", "JPEG": "image/jpeg"}
+_EXTENSIONS = {"WEBP": ".webp", "JPEG": ".jpg"}
+
+if AVATAR_FORMAT not in _MIME_TYPES:
+    print(f"Unsupported AVATAR_FORMAT {AVATAR_FORMAT!r}, using WEBP")
+    AVATAR_FORMAT = "WEBP"
+
+if Image is not None:
+    # Applies in the worker processes too, which import this module
+    Image.MAX_IMAGE_PIXELS = IMAGE_MAX_PIXELS
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def image_processing_available() -> bool:
+    """Whether Pillow is installed."""
+    return Image is not None
+
+
+def _encode_avatar(data: bytes, size: int, fmt: str, quality: int) -> Tuple[bytes, str]:
+    """
+    Resize and re-encode an image (runs in a worker process).
+    
+    Orientation from EXIF is applied to the pixels, then all metadata
+    (EXIF, GPS, ICC, comments) is dropped by not passing it to save().
+    
+    Returns:
+        Encoded bytes and the format actually used
+    """
+    if fmt == "WEBP" and not features.check("webp"):
+        fmt = "JPEG"
+    
+    with Image.open(io.BytesIO(data)) as source:
+        # Pillow only warns between the limit and twice it
+        if source.width * source.height > IMAGE_MAX_PIXELS:
+            raise ValueError(f"Image too large: {source.width}x{source.height} pixels")
+        
+        # Let the JPEG decoder downscale while decoding
+        source.draft("RGB", (size * 2, size * 2))
+        image = ImageOps.exif_transpose(source)
+        image.thumbnail((size, size), Image.Resampling.LANCZOS)
+        
+        has_alpha = image.mode in ("RGBA", "LA") or (
+            image.mode == "P" and "transparency" in image.info
+        )
+        if fmt == "WEBP":
+            image = image.convert("RGBA" if has_alpha else "RGB")
+        elif has_alpha:
+            # JPEG has no alpha channel; flatten onto white
+            rgba = image.convert("RGBA")
+            image = Image.new("RGB", rgba.size, (255, 255, 255))
+            image.paste(rgba, mask=rgba.getchannel("A"))
+        else:
+            image = image.convert("RGB")
+        
+        output = io.BytesIO()
+        if fmt == "WEBP":
+            image.save(output, "WEBP", quality=quality, method=4)
+        else:
+            image.save(output, "JPEG", quality=quality, optimize=True, progressive=True)
+        return output.getvalue(), fmt
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    """Worker pool, created on first use."""
+    global _pool
+    if _pool is None:
+        # Spawn rather than fork: the backend process runs an event loop and threads
+        _pool = ProcessPoolExecutor(
+            max_workers=IMAGE_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _pool
+
+
+async def downscale_avatar(data: bytes, filename: str) -> Optional[Tuple[bytes, str, str]]:
+    """
+    Shrink an uploaded image to avatar size off the event loop.
+    
+    Args:
+        data: Raw image bytes
+        filename: Original file name, used to name the result
+    
+    Returns:
+        Tuple of (encoded bytes, new file name, content type), or None if
+        Pillow is unavailable or the file could not be decoded
+    """
+    if not image_processing_available():
+        return None
+    
+    started = time.perf_counter()
+    loop = asyncio.get_running_loop()
+    try:
+        encoded, fmt = await loop.run_in_executor(
+            _get_pool(), _encode_avatar, data, AVATAR_SIZE, AVATAR_FORMAT, AVATAR_QUALITY
+        )
+    except Exception as e:
+        print(f"Avatar processing failed: {e}")
+        IMAGE_PROCESS_LATENCY.observe(time.perf_counter() - started, outcome="error")
+        return None
+    
+    IMAGE_PROCESS_LATENCY.observe(time.perf_counter() - started, outcome="success")
+    IMAGE_BYTES_SAVED.inc(max(0, len(data) - len(encoded)))
+    
+    stem = os.path.splitext(os.path.basename(filename or "avatar"))[0] or "avatar"
+    return encoded, stem + _EXTENSIONS[fmt], _MIME_TYPES[fmt]
+
+
+def shutdown_image_pool():
+    """Stop the worker processes."""
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+@contextlib.asynccontextmanager
+async def image_pool_lifespan():
+    """Reflex lifespan task that stops the image workers on shutdown."""
+    try:
+        yield
+    finally:
+        shutdown_image_pool()
\ No newline at end of file
@@ -0,0 +1,384 @@
+"""In-process metrics with a Prometheus text-format exporter."""
+
+import functools
+import re
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import PlainTextResponse
+from starlette.routing import Route
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds; tuned for upstream API calls on a LAN/regional link
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Known API routes, used to label metrics by template instead of raw path
+ENDPOINT_TEMPLATES = [
+    "/auth/login",
+    "/auth/register",
+    "/auth/refresh",
+    "/users/me",
+    "/users/me/avatar",
+    "/users/",
+    "/rooms/mine",
+    "/rooms/",
+    "/rooms/dm/{username}",
+    "/rooms/{room_id}/join",
+    "/rooms/{room_id}/typing",
+    "/messages/room",
+    "/messages/search",
+    "/messages/direct/{username}",
+    "/messages/{message_id}/read",
+    "/messages/{room_id}",
+]
+
+_TEMPLATE_PATTERNS = [
+    (re.compile("^" + re.sub(r"\\{\w+\\}", "[^/]+", re.escape(t)) + "$"), t)
+    for t in ENDPOINT_TEMPLATES
+]
+
+
+@functools.lru_cache(maxsize=2048)
+def endpoint_template(endpoint: str) -> str:
+    """
+    Map a concrete endpoint to its route template.
+    
+    "/messages/42" -> "/messages/{room_id}". Unknown paths have numeric
+    segments replaced with "{id}" to keep label cardinality bounded.
+    """
+    path = endpoint.split("?", 1)[0]
+    for pattern, template in _TEMPLATE_PATTERNS:
+        if pattern.match(path):
+            return template
+    return re.sub(r"/\d+(?=/|$)", "/{id}", path)
+
+
+def _escape(value: str) -> str:
+    """Escape a label value for the text exposition format."""
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    """Render a Prometheus label set."""
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    """Base class for labelled metrics."""
+    
+    kind = "untyped"
+    
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+    
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+    
+    def render(self) -> List[str]:
+        """Return exposition lines for this metric."""
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+        lines.extend(self._samples())
+        return lines
+    
+    def _samples(self) -> Iterable[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """Monotonically increasing count."""
+    
+    kind = "counter"
+    
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+    
+    def inc(self, amount: float = 1, **labels: str):
+        """Increase the counter."""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+    
+    def _samples(self) -> Iterable[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {value}"
+
+
+class Gauge(_Metric):
+    """Value that can go up and down."""
+    
+    kind = "gauge"
+    
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+    
+    def set(self, value: float, **labels: str):
+        """Set the gauge."""
+        with self._lock:
+            self._values[self._key(labels)] = value
+    
+    def inc(self, amount: float = 1, **labels: str):
+        """Increase the gauge."""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+    
+    def dec(self, amount: float = 1, **labels: str):
+        """Decrease the gauge."""
+        self.inc(-amount, **labels)
+    
+    def _samples(self) -> Iterable[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {value}"
+
+
+class Histogram(_Metric):
+    """Distribution of observed values in cumulative buckets."""
+    
+    kind = "histogram"
+    
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> (bucket counts, sum, count)
+        self._values: Dict[Tuple[str, ...], List] = {}
+    
+    def observe(self, value: float, **labels: str):
+        """Record one observation."""
+        key = self._key(labels)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+    
+    def _samples(self) -> Iterable[str]:
+        with self._lock:
+            items = sorted((key, (list(c), t, n)) for key, (c, t, n) in self._values.items())
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labelnames, key, f'le="{bound}"')
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = _format_labels(self.labelnames, key, 'le="+Inf"')
+            yield f"{self.name}_bucket{labels} {count}"
+            yield f"{self.name}_sum{_format_labels(self.labelnames, key)} {total}"
+            yield f"{self.name}_count{_format_labels(self.labelnames, key)} {count}"
+
+
+class Registry:
+    """Collection of metrics plus callbacks that report external counters."""
+    
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+        self._collectors: List[Callable[[], Dict[str, float]]] = []
+    
+    def register(self, metric: _Metric) -> _Metric:
+        """Add a metric to the registry."""
+        self._metrics.append(metric)
+        return metric
+    
+    def register_collector(self, prefix: str, collect: Callable[[], Dict[str, float]]):
+        """
+        Report a component's `stats()` dict as samples named `{prefix}_{key}`.
+        
+        Args:
+            prefix: Metric name prefix
+            collect: Callable returning current values
+        """
+        self._collectors.append(lambda: {f"{prefix}_{k}": v for k, v in collect().items()})
+    
+    def render(self) -> str:
+        """Render all metrics in Prometheus text format."""
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for collect in self._collectors:
+            for name, value in sorted(collect().items()):
+                lines.append(f"# TYPE {name} untyped")
+                lines.append(f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def counter(name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+    """Create and register a counter."""
+    return REGISTRY.register(Counter(name, documentation, labelnames))
+
+
+def gauge(name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+    """Create and register a gauge."""
+    return REGISTRY.register(Gauge(name, documentation, labelnames))
+
+
+def histogram(
+    name: str,
+    documentation: str,
+    labelnames: Sequence[str] = (),
+    buckets: Optional[Sequence[float]] = None,
+) -> Histogram:
+    """Create and register a histogram."""
+    return REGISTRY.register(Histogram(name, documentation, labelnames, buckets or DEFAULT_BUCKETS))
+
+
+# Upstream API
+UPSTREAM_LATENCY = histogram(
+    "chat_upstream_request_duration_seconds",
+    "Latency of upstream API requests",
+    ["method", "endpoint"],
+)
+UPSTREAM_REQUESTS = counter(
+    "chat_upstream_requests_total",
+    "Upstream API requests by status code ('error' for transport failures)",
+    ["method", "endpoint", "status"],
+)
+UPSTREAM_RETRIES = counter(
+    "chat_upstream_retries_total",
+    "Upstream API requests replayed after a 401",
+    ["method", "endpoint"],
+)
+UPSTREAM_IN_FLIGHT = gauge(
+    "chat_upstream_in_flight_requests",
+    "Upstream API requests currently in flight",
+    ["endpoint"],
+)
+
+UPSTREAM_TIMEOUT = gauge(
+    "chat_upstream_timeout_seconds",
+    "Adaptive request timeout currently applied per endpoint",
+    ["endpoint"],
+)
+CIRCUIT_STATE = gauge(
+    "chat_circuit_state",
+    "Circuit breaker state per endpoint (0=closed, 1=half-open, 2=open)",
+    ["endpoint"],
+)
+CIRCUIT_REJECTED = counter(
+    "chat_circuit_rejected_total",
+    "Requests failed fast because the endpoint's circuit was open",
+    ["endpoint"],
+)
+
+# Token refresh
+TOKEN_REFRESH_LATENCY = histogram(
+    "chat_token_refresh_duration_seconds",
+    "Latency of /auth/refresh calls",
+    ["outcome"],
+)
+
+# Uploads
+UPLOAD_BYTES = counter(
+    "chat_upload_bytes_total",
+    "Bytes streamed to the API by file uploads",
+)
+UPLOAD_THROUGHPUT = histogram(
+    "chat_upload_throughput_bytes_per_second",
+    "Throughput of completed file uploads",
+    buckets=(64e3, 256e3, 1e6, 4e6, 16e6, 64e6, 256e6),
+)
+UPLOAD_REJECTED = counter(
+    "chat_upload_rejected_total",
+    "Uploads rejected before or while streaming",
+    ["reason"],
+)
+
+IMAGE_PROCESS_LATENCY = histogram(
+    "chat_image_process_duration_seconds",
+    "Time to downscale and re-encode an uploaded image",
+    ["outcome"],
+)
+IMAGE_BYTES_SAVED = counter(
+    "chat_image_bytes_saved_total",
+    "Upload bytes avoided by re-encoding images before upload",
+)
+
+# Per-session room message cache
+ROOM_CACHE_REQUESTS = counter(
+    "chat_room_cache_requests_total",
+    "Room switches served from the per-session message cache",
+    ["result"],
+)
+ROOM_CACHE_EVICTIONS = counter(
+    "chat_room_cache_evictions_total",
+    "Rooms dropped from a session's message cache",
+    ["reason"],
+)
+ROOM_PREFETCH = counter(
+    "chat_room_prefetch_total",
+    "Background prefetches of room messages by outcome",
+    ["outcome"],
+)
+
+# WebSocket
+WS_CONNECTIONS = gauge(
+    "chat_websocket_connections",
+    "Open upstream WebSocket connections",
+)
+WS_CONNECT_ATTEMPTS = counter(
+    "chat_websocket_connect_attempts_total",
+    "Upstream WebSocket connection attempts",
+    ["outcome"],
+)
+WS_CONNECT_LATENCY = histogram(
+    "chat_websocket_connect_duration_seconds",
+    "Time to establish an upstream WebSocket connection",
+)
+WS_MESSAGES = counter(
+    "chat_websocket_messages_total",
+    "WebSocket frames by direction and type",
+    ["direction", "type"],
+)
+WS_HANDLER_LATENCY = histogram(
+    "chat_websocket_handler_duration_seconds",
+    "Time spent handling one incoming WebSocket frame",
+    ["type"],
+)
+WS_HUB_DROPPED = counter(
+    "chat_websocket_hub_dropped_total",
+    "Events dropped because a session's hub queue was full",
+)
+
+
+def render_metrics() -> str:
+    """Render the worker's metrics in Prometheus text format."""
+    return REGISTRY.render()
+
+
+async def metrics_endpoint(request: Request) -> PlainTextResponse:
+    """Serve metrics for Prometheus scraping."""
+    return PlainTextResponse(render_metrics(), media_type=CONTENT_TYPE)
+
+
+# Mounted in front of the Reflex backend via rx.App(api_transformer=...)
+metrics_api = Starlette(routes=[Route("/metrics", metrics_endpoint, methods=["GET"])])
\ No newline at end of file
@@ -0,0 +1,230 @@
+"""Durable per-room outbox for messages that could not be delivered."""
+
+import os
+import random
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+
+from .metrics import REGISTRY
+
+OUTBOX_PATH = os.getenv("OUTBOX_PATH", ".chat_outbox.sqlite3")
+# Messages sent per flush pass
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "20"))
+# Retry delay: random in [0, min(max, base * 2^attempts)] seconds
+OUTBOX_BACKOFF_BASE = float(os.getenv("OUTBOX_BACKOFF_BASE", "1"))
+OUTBOX_BACKOFF_MAX = float(os.getenv("OUTBOX_BACKOFF_MAX", "60"))
+# Automatic attempts before a message waits for a manual retry
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "10"))
+# Seconds a flusher owns a message it is sending (keep above HTTP_TIMEOUT)
+OUTBOX_CLAIM_TTL = float(os.getenv("OUTBOX_CLAIM_TTL", "60"))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    owner TEXT NOT NULL,
+    room_id INTEGER NOT NULL,
+    client_id TEXT NOT NULL UNIQUE,
+    content TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    claimed_by TEXT,
+    claimed_until REAL NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS outbox_owner ON outbox (owner, room_id, seq);
+"""
+
+
+def backoff_delay(attempts: int) -> float:
+    """Full-jitter exponential backoff for the given number of failed attempts."""
+    return random.uniform(0, min(OUTBOX_BACKOFF_MAX, OUTBOX_BACKOFF_BASE * 2 ** attempts))
+
+
+def _available_at(entry: Dict, claimant: Optional[str]) -> float:
+    """When a queued message may be sent by `claimant`, given others' claims."""
+    if entry["claimed_by"] not in (None, claimant):
+        return max(entry["next_attempt_at"], entry["claimed_until"])
+    return entry["next_attempt_at"]
+
+
+class Outbox:
+    """
+    Unsent messages per user and room, in send order, stored in SQLite.
+    
+    Entries survive backend restarts; they are flushed again the next time
+    their owner's session loads. Several tabs or workers may flush the
+    same owner's messages: each message is claimed before it is sent, and
+    a message claimed by another flusher holds back the rest of its room
+    until the claim is released or expires.
+    """
+    
+    def __init__(self, path: str = OUTBOX_PATH):
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+    
+    def _db(self) -> sqlite3.Connection:
+        """Connection, opened and migrated on first use."""
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+            # Outboxes created before claims existed
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(outbox)")}
+            if "claimed_by" not in columns:
+                conn.execute("ALTER TABLE outbox ADD COLUMN claimed_by TEXT")
+                conn.execute("ALTER TABLE outbox ADD COLUMN claimed_until REAL NOT NULL DEFAULT 0")
+            self._conn = conn
+        return self._conn
+    
+    def enqueue(self, owner: str, room_id: int, client_id: str, content: str, attempts: int = 0):
+        """
+        Queue a message behind the room's other unsent messages.
+        
+        Args:
+            owner: User the message belongs to
+            room_id: Destination room
+            client_id: Client-generated id, also sent to the server for deduplication
+            content: Message text
+            attempts: Delivery attempts already made (delays the first retry)
+        """
+        next_attempt_at = time.time() + backoff_delay(attempts) if attempts else 0
+        with self._lock:
+            self._db().execute(
+                "INSERT OR IGNORE INTO outbox (owner, room_id, client_id, content, attempts, next_attempt_at, created_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (owner, room_id, client_id, content, attempts, next_attempt_at, time.time()),
+            )
+    
+    def pending(self, owner: str, room_id: Optional[int] = None) -> List[Dict]:
+        """Unsent messages for a user (optionally one room), oldest first."""
+        query = "SELECT * FROM outbox WHERE owner = ?"
+        params: tuple = (owner,)
+        if room_id is not None:
+            query += " AND room_id = ?"
+            params += (room_id,)
+        with self._lock:
+            rows = self._db().execute(query + " ORDER BY seq", params).fetchall()
+        return [dict(row) for row in rows]
+    
+    def due_batch(
+        self,
+        owner: str,
+        limit: int = OUTBOX_BATCH_SIZE,
+        claimant: Optional[str] = None,
+    ) -> List[Dict]:
+        """
+        Messages ready to send now, oldest first.
+        
+        Only each room's leading run of due messages is returned, so a
+        message is never sent before an earlier one in the same room.
+        
+        Args:
+            owner: User whose messages to send
+            limit: Maximum messages returned
+            claimant: The calling flusher; others' live claims block their room
+        """
+        now = time.time()
+        blocked = set()
+        batch = []
+        for entry in self.pending(owner):
+            if entry["room_id"] in blocked:
+                continue
+            if _available_at(entry, claimant) > now:
+                blocked.add(entry["room_id"])
+                continue
+            batch.append(entry)
+            if len(batch) >= limit:
+                break
+        return batch
+    
+    def next_attempt_in(self, owner: str, claimant: Optional[str] = None) -> Optional[float]:
+        """
+        Seconds until one of the owner's rooms can send again.
+        
+        Only each room's first message counts: messages behind a backed-off
+        one wait for it whatever their own time. Returns None if nothing is
+        queued or every room waits for a manual retry.
+        """
+        heads: Dict[int, Dict] = {}
+        for entry in self.pending(owner):
+            heads.setdefault(entry["room_id"], entry)
+        
+        due_at = [_available_at(entry, claimant) for entry in heads.values()]
+        due_at = [t for t in due_at if t != float("inf")]
+        if not due_at:
+            return None
+        return max(0.0, min(due_at) - time.time())
+    
+    def claim(self, client_id: str, claimant: str) -> bool:
+        """
+        Take a message for sending, unless another flusher holds a live claim.
+        
+        Returns:
+            Whether the caller may send the message
+        """
+        now = time.time()
+        with self._lock:
+            cursor = self._db().execute(
+                "UPDATE outbox SET claimed_by = ?, claimed_until = ?"
+                " WHERE client_id = ? AND (claimed_by IS NULL OR claimed_by = ? OR claimed_until < ?)",
+                (claimant, now + OUTBOX_CLAIM_TTL, client_id, claimant, now),
+            )
+        return cursor.rowcount > 0
+    
+    def remove(self, client_id: str):
+        """Forget a delivered message."""
+        with self._lock:
+            self._db().execute("DELETE FROM outbox WHERE client_id = ?", (client_id,))
+    
+    def record_failure(self, client_id: str):
+        """
+        Push a message's next attempt back with jittered exponential backoff.
+        
+        After OUTBOX_MAX_ATTEMPTS the message is only retried by `retry_now`.
+        """
+        with self._lock:
+            db = self._db()
+            row = db.execute("SELECT attempts FROM outbox WHERE client_id = ?", (client_id,)).fetchone()
+            if row is None:
+                return
+            attempts = row["attempts"] + 1
+            if attempts >= OUTBOX_MAX_ATTEMPTS:
+                next_attempt_at = float("inf")
+            else:
+                next_attempt_at = time.time() + backoff_delay(attempts)
+            db.execute(
+                "UPDATE outbox SET attempts = ?, next_attempt_at = ?, claimed_by = NULL, claimed_until = 0"
+                " WHERE client_id = ?",
+                (attempts, next_attempt_at, client_id),
+            )
+    
+    def retry_now(self, client_id: str) -> bool:
+        """
+        Make a message, and everything queued before it in its room, due now.
+        
+        Returns:
+            Whether the message is queued
+        """
+        with self._lock:
+            cursor = self._db().execute(
+                "UPDATE outbox SET next_attempt_at = 0"
+                " WHERE (owner, room_id) = (SELECT owner, room_id FROM outbox WHERE client_id = ?)"
+                " AND seq <= (SELECT seq FROM outbox WHERE client_id = ?)",
+                (client_id, client_id),
+            )
+        return cursor.rowcount > 0
+    
+    def stats(self) -> Dict[str, int]:
+        """Return queue size."""
+        with self._lock:
+            (count,) = self._db().execute("SELECT COUNT(*) FROM outbox").fetchone()
+        return {"pending": count}
+
+
+# Worker-wide outbox
+outbox = Outbox()
+REGISTRY.register_collector("chat_outbox", outbox.stats)
\ No newline at end of file
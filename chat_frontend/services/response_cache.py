@@ -0,0 +1,134 @@
+"""Per-user TTL + ETag cache for idempotent GET responses."""
+
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from .metrics import REGISTRY
+
+# Endpoints eligible for caching and how long a response stays fresh (seconds)
+CACHE_TTLS: Dict[str, float] = {
+    "/users/me": float(os.getenv("CACHE_TTL_USERS_ME", "60")),
+    "/users/": float(os.getenv("CACHE_TTL_USERS", "60")),
+    "/rooms/mine": float(os.getenv("CACHE_TTL_ROOMS_MINE", "30")),
+}
+
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "2000"))
+
+CacheKey = Tuple[str, str, Tuple]
+
+
+def copy_json(value: Any) -> Any:
+    """Deep copy of decoded JSON (dicts, lists and scalars), faster than deepcopy."""
+    if isinstance(value, dict):
+        return {k: copy_json(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [copy_json(v) for v in value]
+    return value
+
+
+class CacheEntry:
+    """A cached response body with its validator."""
+    
+    __slots__ = ("data", "etag", "expires_at")
+    
+    def __init__(self, data: Any, etag: Optional[str], ttl: float):
+        self.data = data
+        self.etag = etag
+        self.expires_at = time.monotonic() + ttl
+    
+    def is_fresh(self) -> bool:
+        """Whether the entry can be served without revalidation."""
+        return time.monotonic() < self.expires_at
+    
+    def value(self) -> Any:
+        """Copy of the cached body, safe for the caller to mutate."""
+        return copy_json(self.data)
+
+
+class ResponseCache:
+    """
+    Bounded LRU of GET responses keyed by auth scope, endpoint and params.
+    
+    Stale entries that carry an ETag are kept so the next request can
+    revalidate them with If-None-Match instead of downloading the body.
+    """
+    
+    def __init__(
+        self,
+        ttls: Dict[str, float] = CACHE_TTLS,
+        max_entries: int = RESPONSE_CACHE_MAX_ENTRIES,
+    ):
+        self.ttls = ttls
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[CacheKey, CacheEntry]" = OrderedDict()
+        
+        # Counters
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+    
+    def ttl_for(self, endpoint: str) -> Optional[float]:
+        """TTL for an endpoint, or None if it is not cacheable."""
+        ttl = self.ttls.get(endpoint)
+        return ttl if ttl and ttl > 0 else None
+    
+    @staticmethod
+    def make_key(scope: str, endpoint: str, params: Optional[Dict] = None) -> CacheKey:
+        """Build a cache key from the caller's scope and the request."""
+        return (scope, endpoint, tuple(sorted((params or {}).items())))
+    
+    def get(self, key: CacheKey) -> Optional[CacheEntry]:
+        """Look up an entry (fresh or stale) and mark it recently used."""
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        
+        self._entries.move_to_end(key)
+        if entry.is_fresh():
+            self.hits += 1
+        return entry
+    
+    def store(self, key: CacheKey, data: Any, etag: Optional[str], ttl: float):
+        """Insert or replace an entry, evicting the least recently used."""
+        self._entries[key] = CacheEntry(copy_json(data), etag, ttl)
+        self._entries.move_to_end(key)
+        
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+    
+    def revalidate(self, key: CacheKey, ttl: float) -> Optional[CacheEntry]:
+        """Extend an entry after the server answered 304 Not Modified."""
+        entry = self._entries.get(key)
+        if entry is not None:
+            entry.expires_at = time.monotonic() + ttl
+            self.revalidated += 1
+        return entry
+    
+    def invalidate(self, scope: str, *endpoints: str):
+        """
+        Drop cached responses for a user.
+        
+        Args:
+            scope: Auth scope whose entries are dropped
+            endpoints: Endpoints to drop; all of the scope's entries if empty
+        """
+        for key in list(self._entries):
+            if key[0] == scope and (not endpoints or key[1] in endpoints):
+                del self._entries[key]
+    
+    def stats(self) -> Dict[str, int]:
+        """Return cache counters."""
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "revalidated": self.revalidated,
+        }
+
+
+# Worker-wide cache
+response_cache = ResponseCache()
+REGISTRY.register_collector("chat_response_cache", response_cache.stats)
\ No newline at end of file
@@ -0,0 +1,470 @@
+"""In-memory search indexes for rooms and messages."""
+
+import bisect
+import heapq
+import itertools
+import re
+import unicodedata
+from collections import defaultdict
+from typing import Dict, Hashable, Iterable, List, Optional, Sequence, Set, Tuple
+
+_WORD = re.compile(r"\w+")
+
+
+def normalize(text: str) -> str:
+    """Lowercase and strip accents so "Café" matches "cafe"."""
+    decomposed = unicodedata.normalize("NFKD", text or "")
+    return "".join(c for c in decomposed if not unicodedata.combining(c)).casefold()
+
+
+def trigrams(text: str) -> Set[str]:
+    """Padded character trigrams of each word."""
+    grams = set()
+    for word in _WORD.findall(text):
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def _normalize_with_offsets(text: str) -> Tuple[str, Sequence[int]]:
+    """`normalize(text)` plus, per normalized character, its index in `text`."""
+    if text.isascii():
+        return text.lower(), range(len(text))
+    chars = []
+    offsets = []
+    for i, c in enumerate(text):
+        for n in normalize(c):
+            chars.append(n)
+            offsets.append(i)
+    return "".join(chars), offsets
+
+
+def highlight(text: str, query: str, context: int = 40) -> Tuple[str, str, str]:
+    """
+    Split `text` around the first word starting with a query word.
+    
+    Matching uses `normalize`, like the indexes, so "cafe" highlights
+    "Café"; the returned parts are slices of the original text.
+    
+    Args:
+        text: Text to show
+        query: Search query
+        context: Characters kept on each side of the match
+    
+    Returns:
+        (before, match, after); match is empty if no query word was found
+    """
+    text = text or ""
+    folded, offsets = _normalize_with_offsets(text)
+    found = None
+    for word in _WORD.findall(normalize(query)):
+        m = re.search(r"(?<!\w)" + re.escape(word), folded)
+        if m and (found is None or m.start() < found.start()):
+            found = m
+    if found is None:
+        return (text[:2 * context] + ("…" if len(text) > 2 * context else ""), "", "")
+    
+    start = offsets[found.start()]
+    end = offsets[found.end() - 1] + 1
+    # Keep combining marks that normalize away, e.g. a decomposed "é"
+    while end < len(text) and not normalize(text[end]):
+        end += 1
+    before = text[max(0, start - context):start]
+    after = text[end:end + context]
+    if start > context:
+        before = "…" + before
+    if end + context < len(text):
+        after += "…"
+    return (before, text[start:end], after)
+
+
+class SearchIndex:
+    """
+    Trigram index plus sorted word and text lists for prefix lookups.
+    
+    `update` syncs the index with a full document list, touching only the
+    changed documents; `add` and `remove` change a single document without
+    looking at the others. Every query is first matched as word prefixes
+    against the word list; queries of three or more characters that match
+    nothing fall back to trigram overlap, which tolerates typos.
+    """
+    
+    def __init__(self):
+        self._texts: Dict[Hashable, str] = {}
+        self._order: Dict[Hashable, int] = {}
+        self._next_order = 0
+        self._postings: Dict[str, Set[Hashable]] = defaultdict(set)
+        self._words: List[Tuple[str, Hashable]] = []
+        # (text, key) sorted, for documents starting with a query
+        self._sorted_texts: List[Tuple[str, Hashable]] = []
+        self._doc_words: Dict[Hashable, Tuple[str, ...]] = {}
+    
+    def __len__(self) -> int:
+        return len(self._texts)
+    
+    def update(self, documents: Iterable[Tuple[Hashable, str]]):
+        """
+        Make the index match `documents`, touching only what changed.
+        
+        Args:
+            documents: (key, text) pairs in display order; keys not listed are removed
+        """
+        documents = list(documents)
+        wanted = {key: normalize(text) for key, text in documents}
+        
+        for key in [k for k in self._texts if wanted.get(k) != self._texts[k]]:
+            self._remove(key)
+        
+        added = [(key, text) for key, text in wanted.items() if key not in self._texts]
+        # Large batches (first build) sort the word list once instead of inserting
+        bulk = len(added) > 64
+        for key, text in added:
+            self._add(key, text, insort=not bulk)
+        if bulk:
+            self._words.sort()
+            self._sorted_texts.sort()
+        
+        self._order = {key: i for i, (key, _) in enumerate(documents)}
+        self._next_order = len(documents)
+    
+    def add(self, key: Hashable, text: str):
+        """Index one document after all others, replacing any previous version."""
+        text = normalize(text)
+        if key in self._texts:
+            if self._texts[key] == text:
+                return
+            self._remove(key)
+        self._add(key, text)
+        if key not in self._order:
+            self._order[key] = self._next_order
+            self._next_order += 1
+    
+    def remove(self, key: Hashable):
+        """Drop one document."""
+        if key in self._texts:
+            self._remove(key)
+        self._order.pop(key, None)
+    
+    def search(self, query: str, limit: int = 50) -> List[Hashable]:
+        """
+        Keys of documents matching `query`, best first.
+        
+        Documents with a word starting with each query word match; if none
+        do, documents sharing half the query's trigrams match instead
+        (typos). Exact matches rank first, then documents starting with the
+        query, then ones containing it. Ties keep document order.
+        """
+        query = normalize(query).strip()
+        if not query:
+            return []
+        if _WORD.fullmatch(query):
+            return self._search_word(query, limit)
+        
+        # Prefix match on words first; fall back to trigrams for typos
+        scores = self._prefix_scores(query)
+        if not scores and len(query) >= 3:
+            scores = self._trigram_scores(query)
+        
+        for key in scores:
+            text = self._texts[key]
+            if text == query:
+                scores[key] += 3
+            elif text.startswith(query):
+                scores[key] += 2
+            elif query in text:
+                scores[key] += 1
+        
+        order = self._order
+        return heapq.nsmallest(limit, scores, key=lambda k: (-scores[k], order.get(k, 0)))
+    
+    def _search_word(self, query: str, limit: int) -> List[Hashable]:
+        """
+        `search` for a single-word query without scoring every match.
+        
+        Short queries match a large share of documents, so instead of
+        ranking all of them this takes the documents starting with the
+        query (exact first) from the sorted texts and only looks at the
+        other prefix matches when those do not fill `limit`.
+        """
+        order = self._order
+        rank = lambda k: order.get(k, 0)
+        
+        lo = bisect.bisect_left(self._sorted_texts, (query,))
+        hi = bisect.bisect_left(self._sorted_texts, (query + "\U0010ffff",), lo)
+        mid = lo
+        while mid < hi and self._sorted_texts[mid][0] == query:
+            mid += 1
+        exact = sorted((key for _, key in self._sorted_texts[lo:mid]), key=rank)
+        best = exact + heapq.nsmallest(
+            limit - len(exact), (key for _, key in self._sorted_texts[mid:hi]), key=rank
+        )
+        if len(best) >= limit:
+            return best[:limit]
+        
+        leading = {key for _, key in self._sorted_texts[lo:hi]}
+        rest = [key for key in self._prefix_scores(query) if key not in leading]
+        if not rest and not best:
+            # Typos: same ranking as multi-word queries
+            scores = self._trigram_scores(query) if len(query) >= 3 else {}
+            for key in scores:
+                if query in self._texts[key]:
+                    scores[key] += 1
+            return heapq.nsmallest(limit, scores, key=lambda k: (-scores[k], rank(k)))
+        return best + heapq.nsmallest(limit - len(best), rest, key=rank)
+    
+    def _prefix_scores(self, query: str) -> Dict[Hashable, float]:
+        """Documents having a word that starts with each query word."""
+        parts = _WORD.findall(query)
+        if not parts:
+            return {}
+        
+        # Word-list range per query word; seed from the narrowest one
+        ranges = []
+        for part in parts:
+            lo = bisect.bisect_left(self._words, (part,))
+            hi = bisect.bisect_left(self._words, (part + "\U0010ffff",), lo)
+            if lo == hi:
+                return {}
+            ranges.append((hi - lo, lo, hi))
+        ranges.sort()
+        _, lo, hi = ranges[0]
+        
+        matches = {key for _, key in self._words[lo:hi]}
+        if len(parts) > 1:
+            matches = {
+                key for key in matches
+                if all(
+                    any(word.startswith(part) for word in self._doc_words[key])
+                    for part in parts
+                )
+            }
+        return dict.fromkeys(matches, 1.0)
+    
+    def _trigram_scores(self, query: str) -> Dict[Hashable, float]:
+        """Documents sharing at least half of the query's trigrams."""
+        grams = trigrams(query)
+        postings = sorted((self._postings.get(gram, ()) for gram in grams), key=len)
+        need = max(1, (len(grams) + 1) // 2)
+        
+        # A document with `need` shared trigrams must appear in one of the
+        # len - need + 1 shortest posting lists, so only those seed candidates
+        candidates = set(itertools.chain.from_iterable(postings[:len(postings) - need + 1]))
+        scores = {}
+        for key in candidates:
+            count = sum(1 for keys in postings if key in keys)
+            if count >= need:
+                scores[key] = count / len(grams)
+        return scores
+    
+    def _add(self, key: Hashable, text: str, insort: bool = True):
+        self._texts[key] = text
+        self._doc_words[key] = tuple(set(_WORD.findall(text)))
+        if insort:
+            bisect.insort(self._sorted_texts, (text, key))
+        else:
+            self._sorted_texts.append((text, key))
+        for gram in trigrams(text):
+            self._postings[gram].add(key)
+        for word in self._doc_words[key]:
+            if insort:
+                bisect.insort(self._words, (word, key))
+            else:
+                self._words.append((word, key))
+    
+    def _remove(self, key: Hashable):
+        text = self._texts.pop(key)
+        del self._doc_words[key]
+        i = bisect.bisect_left(self._sorted_texts, (text, key))
+        if i < len(self._sorted_texts) and self._sorted_texts[i] == (text, key):
+            del self._sorted_texts[i]
+        for gram in trigrams(text):
+            keys = self._postings.get(gram)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._postings[gram]
+        for word in set(_WORD.findall(text)):
+            i = bisect.bisect_left(self._words, (word, key))
+            if i < len(self._words) and self._words[i] == (word, key):
+                del self._words[i]
+
+
+class TextIndex:
+    """
+    Inverted index of the words in longer texts, e.g. message bodies.
+    
+    Every query word must match a word of the text; the last query word
+    also matches as a prefix so results update while typing. Documents
+    can be added and removed one at a time as messages arrive or change.
+    """
+    
+    def __init__(self):
+        self._postings: Dict[str, Set[Hashable]] = defaultdict(set)
+        self._doc_terms: Dict[Hashable, Tuple[str, ...]] = {}
+        self._seq: Dict[Hashable, int] = {}
+        self._next_seq = 0
+        # Below every sequence number in use, for documents older than all others
+        self._first_seq = 0
+        # (seq, key) oldest first; entries of removed documents are skipped
+        self._arrivals: List[Tuple[int, Hashable]] = []
+        # Sorted distinct words, for prefix lookups
+        self._vocabulary: List[str] = []
+    
+    def __len__(self) -> int:
+        return len(self._doc_terms)
+    
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._doc_terms
+    
+    def rebuild(self, documents: Iterable[Tuple[Hashable, str]]):
+        """Replace the index with `documents` (oldest first)."""
+        self.__init__()
+        for key, text in documents:
+            self._index(key, text)
+        self._vocabulary = sorted(self._postings)
+    
+    def add(self, key: Hashable, text: str):
+        """Index a document as the newest one, replacing any previous version."""
+        if key in self._doc_terms:
+            self.remove(key)
+        for term in self._index(key, text):
+            if len(self._postings[term]) == 1:
+                bisect.insort(self._vocabulary, term)
+    
+    def prepend(self, documents: Iterable[Tuple[Hashable, str]]):
+        """
+        Index documents older than every indexed one (oldest first), e.g. a
+        page of history loaded above the messages already indexed.
+        
+        Documents already indexed are skipped.
+        """
+        documents = [(key, text) for key, text in documents if key not in self._doc_terms]
+        seq = self._first_seq - len(documents)
+        self._first_seq = seq
+        arrivals = []
+        new_terms = []
+        for key, text in documents:
+            terms = tuple(set(_WORD.findall(normalize(text))))
+            self._doc_terms[key] = terms
+            self._seq[key] = seq
+            arrivals.append((seq, key))
+            seq += 1
+            for term in terms:
+                keys = self._postings[term]
+                if not keys:
+                    new_terms.append(term)
+                keys.add(key)
+        self._arrivals = arrivals + self._arrivals
+        if new_terms:
+            # Merging two sorted runs is linear
+            self._vocabulary = sorted(self._vocabulary + sorted(new_terms))
+    
+    def remove(self, key: Hashable):
+        """Drop a document."""
+        terms = self._doc_terms.pop(key, ())
+        self._seq.pop(key, None)
+        for term in terms:
+            keys = self._postings.get(term)
+            if keys is None:
+                continue
+            keys.discard(key)
+            if not keys:
+                del self._postings[term]
+                i = bisect.bisect_left(self._vocabulary, term)
+                if i < len(self._vocabulary) and self._vocabulary[i] == term:
+                    del self._vocabulary[i]
+    
+    def search(self, query: str, limit: int = 50) -> List[Hashable]:
+        """
+        Keys of documents containing every query word, newest first.
+        
+        Common words and short prefixes match a large share of the
+        documents; instead of collecting and ranking all of them, the
+        newest documents are then checked one by one until `limit` match.
+        """
+        words = _WORD.findall(normalize(query))
+        if not words:
+            return []
+        
+        *whole, last = words
+        sets = sorted((self._postings.get(word, set()) for word in whole), key=len)
+        lo = bisect.bisect_left(self._vocabulary, last)
+        hi = bisect.bisect_left(self._vocabulary, last + "\U0010ffff", lo)
+        if lo == hi or (sets and not sets[0]):
+            return []
+        
+        # Upper bound on the matches, i.e. the work of the set path below
+        bound = 0
+        for term in self._vocabulary[lo:hi]:
+            bound += len(self._postings[term])
+            if bound >= len(self._seq):
+                break
+        if sets:
+            bound = min(bound, len(sets[0]))
+        if bound > 4 * limit:
+            found = self._scan_newest(sets, last, self._vocabulary[lo:hi], limit, bound)
+            if found is not None:
+                return found
+        
+        # Last word as a prefix: union of the postings of matching words
+        if hi - lo == 1:
+            sets.append(self._postings[self._vocabulary[lo]])
+        else:
+            sets.append(set().union(*(self._postings[t] for t in self._vocabulary[lo:hi])))
+        
+        sets.sort(key=len)
+        matches = set(sets[0])
+        for keys in sets[1:]:
+            if not matches:
+                break
+            matches &= keys
+        
+        seq = self._seq
+        return heapq.nlargest(limit, matches, key=lambda k: seq[k])
+    
+    def _scan_newest(
+        self,
+        sets: List[Set[Hashable]],
+        last: str,
+        prefixed: List[str],
+        limit: int,
+        budget: int,
+    ) -> Optional[List[Hashable]]:
+        """
+        Check documents newest first until `limit` match.
+        
+        Gives up (returns None) after `budget` documents, so a query whose
+        matches are rare costs at most about twice the set path.
+        """
+        only = self._postings[prefixed[0]] if len(prefixed) == 1 else None
+        seq = self._seq
+        found = []
+        for i, (arrived, key) in enumerate(reversed(self._arrivals)):
+            if i >= budget:
+                return None
+            if seq.get(key) != arrived:
+                continue
+            if not all(key in keys for keys in sets):
+                continue
+            if only is not None:
+                if key not in only:
+                    continue
+            elif not any(term.startswith(last) for term in self._doc_terms[key]):
+                continue
+            found.append(key)
+            if len(found) == limit:
+                break
+        return found
+    
+    def _index(self, key: Hashable, text: str) -> Tuple[str, ...]:
+        terms = tuple(set(_WORD.findall(normalize(text))))
+        self._doc_terms[key] = terms
+        self._seq[key] = self._next_seq
+        self._arrivals.append((self._next_seq, key))
+        self._next_seq += 1
+        if len(self._arrivals) > 2 * len(self._seq) + 1024:
+            # Mostly removed documents; drop their entries
+            self._arrivals = [(arrived, key) for arrived, key in self._arrivals if self._seq.get(key) == arrived]
+        for term in terms:
+            self._postings[term].add(key)
+        return terms
\ No newline at end of file
@@ -0,0 +1,124 @@
+"""In-process registry of the background tasks each browser session runs."""
+
+import asyncio
+from typing import Coroutine, Dict, Optional, Tuple
+
+from .metrics import REGISTRY
+
+
+class SessionTasks:
+    """
+    Track one named background task per session (client token), and the
+    futures those tasks wait on.
+    
+    Kept in worker memory rather than on the state: state is pickled and
+    outlives a restart, the tasks do not, so a "running" flag stored there
+    would reload as set with nothing running behind it.
+    """
+    
+    def __init__(self):
+        self._tasks: Dict[Tuple[str, str], asyncio.Task] = {}
+        # Set to cut a live task's `sleep` short
+        self._wakeups: Dict[Tuple[str, str], asyncio.Event] = {}
+        # Resolved by another task or callback of the same session
+        self._futures: Dict[Tuple[str, str], asyncio.Future] = {}
+    
+    def claim(self, session: str, name: str) -> bool:
+        """
+        Register the current task as the session's `name` task.
+        
+        Returns:
+            False if another live task already holds the name, in which
+            case the caller should return and leave the work to it
+        """
+        key = (session, name)
+        task = asyncio.current_task()
+        holder = self._tasks.get(key)
+        if holder is not None and holder is not task and not holder.done():
+            return False
+        self._tasks[key] = task
+        task.add_done_callback(lambda done: self._forget(key, done))
+        return True
+    
+    def start(self, session: str, name: str, coro: Coroutine) -> Optional[asyncio.Task]:
+        """
+        Run `coro` as the session's `name` task, unless one is already live.
+        
+        Returns:
+            The new task, or None if `coro` was discarded
+        """
+        if self.running(session, name):
+            coro.close()
+            return None
+        task = asyncio.create_task(coro)
+        self._tasks[(session, name)] = task
+        task.add_done_callback(lambda done: self._forget((session, name), done))
+        return task
+    
+    def running(self, session: str, name: str) -> bool:
+        """Whether a live task holds `name` for the session."""
+        task = self._tasks.get((session, name))
+        return task is not None and not task.done()
+    
+    def release(self, session: str, name: str):
+        """
+        Give up `name` from inside its task before returning.
+        
+        Lets the caller decide to stop under the state lock and have the
+        next event start a fresh task, even while this one is still
+        unwinding.
+        """
+        self._forget((session, name), asyncio.current_task())
+    
+    def cancel(self, session: str, name: str):
+        """Cancel the session's `name` task, unless it is the caller, and free the name."""
+        task = self._tasks.pop((session, name), None)
+        self._wakeups.pop((session, name), None)
+        if task is not None and task is not asyncio.current_task():
+            task.cancel()
+    
+    async def sleep(self, session: str, name: str, delay: float):
+        """Sleep up to `delay` seconds, returning early if `wake` is called for the name."""
+        wakeup = self._wakeups.setdefault((session, name), asyncio.Event())
+        try:
+            await asyncio.wait_for(wakeup.wait(), delay)
+        except asyncio.TimeoutError:
+            pass
+        wakeup.clear()
+    
+    def wake(self, session: str, name: str):
+        """Cut the session's `name` task's current or next `sleep` short, if it is live."""
+        if self.running(session, name):
+            self._wakeups.setdefault((session, name), asyncio.Event()).set()
+    
+    def future(self, session: str, key: str) -> asyncio.Future:
+        """Create (replacing any previous one) the session's future for `key`."""
+        future = asyncio.get_running_loop().create_future()
+        self._futures[(session, key)] = future
+        return future
+    
+    def pending(self, session: str, key: str) -> Optional[asyncio.Future]:
+        """The session's future for `key`, if one is outstanding."""
+        return self._futures.get((session, key))
+    
+    def discard(self, session: str, key: str):
+        """Forget the session's future for `key`."""
+        self._futures.pop((session, key), None)
+    
+    def stats(self) -> Dict[str, int]:
+        """Return the number of live tasks and outstanding futures."""
+        return {
+            "running": sum(1 for task in self._tasks.values() if not task.done()),
+            "futures": len(self._futures),
+        }
+    
+    def _forget(self, key: Tuple[str, str], task: asyncio.Task):
+        """Drop a finished or released task, unless the name has moved on."""
+        if self._tasks.get(key) is task:
+            del self._tasks[key]
+            self._wakeups.pop(key, None)
+
+
+# Worker-wide registry, keyed by the session's client token
+session_tasks = SessionTasks()
+REGISTRY.register_collector("chat_session_tasks", session_tasks.stats)
\ No newline at end of file
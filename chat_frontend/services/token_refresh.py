@@ -0,0 +1,172 @@
+"""Single-flight access token refresh shared by all callers in a worker."""
+
+import asyncio
+import base64
+import hashlib
+import json
+import os
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from .http_client import API_URL, get_http_client
+from .metrics import REGISTRY, TOKEN_REFRESH_LATENCY
+
+# How long a completed refresh is reused by late callers that still hold
+# the (now rotated) refresh token it was started with.
+REFRESH_REUSE_WINDOW = float(os.getenv("REFRESH_REUSE_WINDOW", "10"))
+
+# Refresh proactively when the access token expires within this many seconds
+TOKEN_REFRESH_SKEW = float(os.getenv("TOKEN_REFRESH_SKEW", "30"))
+
+
+def decode_jwt_claims(token: str) -> Dict[str, Any]:
+    """
+    Decode the payload of a JWT without verifying its signature.
+    
+    The server verifies tokens; the client only reads claims such as `exp`.
+    
+    Returns:
+        Claims dict, empty if the token cannot be decoded
+    """
+    try:
+        payload = token.split(".")[1]
+        payload += "=" * (-len(payload) % 4)
+        claims = json.loads(base64.urlsafe_b64decode(payload))
+        return claims if isinstance(claims, dict) else {}
+    except Exception:
+        return {}
+
+
+def token_scope(token: str) -> str:
+    """
+    Scope for data fetched with exactly this access token.
+    
+    Claims are never used: they are unverified, so a forged token could
+    name another user's `sub`. Entries keyed by a token are only reachable
+    by whoever holds that token.
+    """
+    if not token:
+        return "anonymous"
+    return "token:" + hashlib.sha256(token.encode()).hexdigest()[:32]
+
+
+def token_expires_within(token: str, seconds: float = TOKEN_REFRESH_SKEW) -> bool:
+    """Whether the token's `exp` claim falls within the next `seconds`."""
+    exp = decode_jwt_claims(token).get("exp") if token else None
+    if not isinstance(exp, (int, float)):
+        return False
+    return exp - time.time() <= seconds
+
+
+async def request_new_tokens(refresh_token: str) -> Optional[Dict]:
+    """
+    Call /auth/refresh once.
+    
+    Returns:
+        Token payload on success, None otherwise
+    """
+    client = get_http_client()
+    started = time.perf_counter()
+    outcome = "error"
+    
+    try:
+        response = await client.post(
+            f"{API_URL}/auth/refresh",
+            json={"refresh_token": refresh_token}
+        )
+        
+        if response.status_code == 200:
+            outcome = "success"
+            print("Token refreshed successfully")
+            return response.json()
+        
+        outcome = "rejected"
+        print("Token refresh failed")
+        return None
+    
+    except Exception as e:
+        print(f"Token refresh error: {e}")
+        return None
+    
+    finally:
+        TOKEN_REFRESH_LATENCY.observe(time.perf_counter() - started, outcome=outcome)
+
+
+class TokenRefresher:
+    """
+    Coalesce concurrent refreshes that use the same refresh token.
+    
+    The first caller starts the upstream request; everyone else holding the
+    same refresh token awaits that result instead of rotating the token
+    against it.
+    """
+    
+    def __init__(self, reuse_window: float = REFRESH_REUSE_WINDOW):
+        self.reuse_window = reuse_window
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._recent: Dict[str, Tuple[float, Dict]] = {}
+        
+        # Counters
+        self.refresh_calls = 0
+        self.refreshes_saved = 0
+    
+    async def refresh(self, refresh_token: str) -> Optional[Dict]:
+        """
+        Refresh tokens, joining an in-flight or just-finished refresh if any.
+        
+        Args:
+            refresh_token: Refresh token held by the caller
+        
+        Returns:
+            Token payload on success, None otherwise
+        """
+        self._prune()
+        
+        recent = self._recent.get(refresh_token)
+        if recent:
+            self.refreshes_saved += 1
+            return recent[1]
+        
+        task = self._inflight.get(refresh_token)
+        if task is None:
+            self.refresh_calls += 1
+            # Run detached so a cancelled caller does not cancel the others
+            task = asyncio.ensure_future(self._run(refresh_token))
+            self._inflight[refresh_token] = task
+        else:
+            self.refreshes_saved += 1
+        
+        return await asyncio.shield(task)
+    
+    def record_saved(self):
+        """Count a 401 replayed with a token another caller already refreshed."""
+        self.refreshes_saved += 1
+    
+    def stats(self) -> Dict[str, int]:
+        """Return refresh counters."""
+        return {
+            "refresh_calls": self.refresh_calls,
+            "refreshes_saved": self.refreshes_saved,
+            "in_flight": len(self._inflight),
+        }
+    
+    async def _run(self, refresh_token: str) -> Optional[Dict]:
+        """Perform the upstream refresh and remember its result briefly."""
+        try:
+            tokens = await request_new_tokens(refresh_token)
+            if tokens:
+                self._recent[refresh_token] = (time.monotonic() + self.reuse_window, tokens)
+            return tokens
+        finally:
+            self._inflight.pop(refresh_token, None)
+    
+    def _prune(self):
+        """Drop reusable results that are past their window."""
+        now = time.monotonic()
+        for token in [t for t, (expires, _) in self._recent.items() if expires <= now]:
+            del self._recent[token]
+
+
+# Worker-wide refresher
+token_refresher = TokenRefresher()
+REGISTRY.register_collector("chat_token_refresh", token_refresher.stats)
\ No newline at end of file
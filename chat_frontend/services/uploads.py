@@ -0,0 +1,110 @@
+"""Streaming multipart bodies for file uploads."""
+
+import os
+import time
+import uuid
+from typing import AsyncIterator, Callable, Dict, Optional, Tuple
+
+import reflex as rx
+
+from .metrics import UPLOAD_BYTES, UPLOAD_REJECTED, UPLOAD_THROUGHPUT
+
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(64 * 1024)))
+AVATAR_MAX_BYTES = int(os.getenv("AVATAR_MAX_BYTES", str(5 * 1024 * 1024)))
+
+BodyFactory = Callable[[], AsyncIterator[bytes]]
+
+
+class UploadTooLargeError(ValueError):
+    """Raised when an upload exceeds its size limit."""
+    
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        super().__init__(f"File is too large (max {format_size(max_bytes)})")
+
+
+def format_size(num_bytes: int) -> str:
+    """Human readable size, e.g. 5 MB."""
+    if num_bytes >= 1024 * 1024:
+        return f"{num_bytes / (1024 * 1024):.3g} MB"
+    if num_bytes >= 1024:
+        return f"{num_bytes / 1024:.3g} KB"
+    return f"{num_bytes} bytes"
+
+
+def upload_size(upload: rx.UploadFile) -> Optional[int]:
+    """Size of an uploaded file without reading it, if it can be determined."""
+    if upload.size is not None:
+        return upload.size
+    try:
+        position = upload.file.tell()
+        size = upload.file.seek(0, os.SEEK_END)
+        upload.file.seek(position)
+        return size
+    except (AttributeError, OSError):
+        return None
+
+
+def _quote(value: str) -> str:
+    """Quote a multipart header parameter the way browsers do."""
+    return value.replace("\\", "\\\\").replace('"', "%22").replace("\r", "%0D").replace("\n", "%0A")
+
+
+def multipart_file_body(
+    upload: rx.UploadFile,
+    field: str = "file",
+    max_bytes: Optional[int] = None,
+    chunk_size: int = UPLOAD_CHUNK_SIZE,
+) -> Tuple[Dict[str, str], BodyFactory]:
+    """
+    Build a multipart/form-data body that streams one file in chunks.
+    
+    Args:
+        upload: File received from rx.upload
+        field: Form field name
+        max_bytes: Abort with UploadTooLargeError once this many bytes were read
+        chunk_size: Bytes read per chunk
+    
+    Returns:
+        Request headers and a factory returning a fresh async body iterator
+        (the factory can be called again to replay the request)
+    """
+    boundary = uuid.uuid4().hex
+    filename = _quote(upload.filename or "upload")
+    content_type = upload.content_type or "application/octet-stream"
+    
+    head = (
+        f"--{boundary}\r\n"
+        f'Content-Disposition: form-data; name="{_quote(field)}"; filename="{filename}"\r\n'
+        f"Content-Type: {content_type}\r\n\r\n"
+    ).encode()
+    tail = f"\r\n--{boundary}--\r\n".encode()
+    
+    headers = {"Content-Type": f"multipart/form-data; boundary={boundary}"}
+    size = upload_size(upload)
+    if size is not None:
+        headers["Content-Length"] = str(len(head) + size + len(tail))
+    
+    async def body() -> AsyncIterator[bytes]:
+        await upload.seek(0)
+        started = time.perf_counter()
+        sent = 0
+        
+        yield head
+        while True:
+            chunk = await upload.read(chunk_size)
+            if not chunk:
+                break
+            sent += len(chunk)
+            if max_bytes is not None and sent > max_bytes:
+                UPLOAD_REJECTED.inc(reason="too_large")
+                raise UploadTooLargeError(max_bytes)
+            yield chunk
+        yield tail
+        
+        elapsed = time.perf_counter() - started
+        UPLOAD_BYTES.inc(sent)
+        if elapsed > 0:
+            UPLOAD_THROUGHPUT.observe(sent / elapsed)
+    
+    return headers, body
\ No newline at end of file
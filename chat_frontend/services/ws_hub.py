@@ -0,0 +1,481 @@
+"""Worker-wide WebSocket hub sharing upstream connections between sessions."""
+
+import asyncio
+import hashlib
+import json
+import os
+import time
+import weakref
+from typing import Callable, Dict, Iterable, Optional, Set, Tuple
+
+from dotenv import load_dotenv
+from websockets import connect, ConnectionClosed
+
+from .http_client import get_http_client
+from .metrics import (
+    REGISTRY,
+    WS_CONNECT_ATTEMPTS,
+    WS_CONNECT_LATENCY,
+    WS_CONNECTIONS,
+    WS_HUB_DROPPED,
+    WS_MESSAGES,
+)
+
+load_dotenv()
+
+WS_URL = os.getenv("WS_URL", "ws://127.0.0.1:8020")
+# One socket per session for all rooms, joined with subscribe/unsubscribe frames
+WS_MULTIPLEX = os.getenv("WS_MULTIPLEX", "false").lower() in ("1", "true", "yes")
+# Share upstream sockets between the worker's sessions (see WebSocketHub)
+WS_HUB = os.getenv("WS_HUB", "false").lower() in ("1", "true", "yes")
+# Events buffered per session; on overflow the backlog is replaced by a resync event
+WS_HUB_QUEUE_SIZE = int(os.getenv("WS_HUB_QUEUE_SIZE", "256"))
+# Seconds a token's /rooms/mine list (and /users/me identity) is trusted
+WS_HUB_ROOMS_TTL = float(os.getenv("WS_HUB_ROOMS_TTL", "30"))
+# Unknown room ids refetch the list at most this often (seconds)
+WS_HUB_ROOMS_MIN_REFRESH = 1.0
+
+# Sent to a session in place of events it fell too far behind to receive
+RESYNC_EVENT = {"type": "resync"}
+
+
+def _callback_ref(callback: Callable) -> Callable[[], Optional[Callable]]:
+    """Reference to a callback; weak for bound methods so a discarded state object detaches itself."""
+    if hasattr(callback, "__self__"):
+        return weakref.WeakMethod(callback)
+    return lambda: callback
+
+
+class _Session:
+    """A browser session's subscriptions and its bounded event queue."""
+    
+    def __init__(self, session_id: str, user_id, token: str, callback: Callable):
+        self.session_id = session_id
+        self.user_id = user_id
+        self.token = token
+        self.callback = _callback_ref(callback)
+        # Room id -> room name
+        self.rooms: Dict[int, str] = {}
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=WS_HUB_QUEUE_SIZE)
+        self.pump: Optional[asyncio.Task] = None
+    
+    def offer(self, event: Dict):
+        """Queue an event, replacing the backlog with a resync if the session is behind."""
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            WS_HUB_DROPPED.inc(self.queue.qsize())
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(RESYNC_EVENT)
+
+
+class _Link:
+    """One upstream socket, shared by every session watching a room or acting as a user."""
+    
+    def __init__(self, hub: "WebSocketHub", kind: str, key, room_name: Optional[str] = None):
+        self.hub = hub
+        # "room" (key is the room id) or "user" (key is the user id)
+        self.kind = kind
+        self.key = key
+        self.room_name = room_name
+        self.sessions: Set[str] = set()
+        self.ws = None
+        self.connected = False
+        self.task: Optional[asyncio.Task] = None
+    
+    def start(self):
+        """Start connecting in the background."""
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self._run())
+    
+    async def stop(self):
+        """Close the socket and stop reconnecting."""
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+    
+    async def send(self, data: Dict) -> bool:
+        """Send a frame; returns False if the link is down."""
+        if self.ws is None or not self.connected:
+            return False
+        try:
+            await self.ws.send(json.dumps(data))
+        except Exception as e:
+            print(f"Failed to send WebSocket message: {e}")
+            return False
+        WS_MESSAGES.inc(direction="out", type=str(data.get("type")))
+        return True
+    
+    def _url(self) -> Optional[str]:
+        """Upstream URL, authenticated as one of the link's current sessions."""
+        token = self.hub._token_for(self)
+        if token is None:
+            return None
+        if self.kind == "room":
+            return f"{WS_URL}/ws?token={token}&room={self.room_name}"
+        return f"{WS_URL}/ws?token={token}"
+    
+    async def _run(self):
+        """Connect, read frames until closed, and reconnect with backoff."""
+        attempts = 0
+        try:
+            while self.sessions:
+                url = self._url()
+                if url is None:
+                    break
+                try:
+                    started = time.perf_counter()
+                    self.ws = await connect(url, ping_interval=20, ping_timeout=10)
+                except Exception as e:
+                    print(f"Hub WebSocket connection failed ({self.kind} {self.key}): {e}")
+                    WS_CONNECT_ATTEMPTS.inc(outcome="failure")
+                    attempts += 1
+                    await asyncio.sleep(min(2 ** (attempts - 1), 30))
+                    continue
+                
+                WS_CONNECT_LATENCY.observe(time.perf_counter() - started)
+                WS_CONNECT_ATTEMPTS.inc(outcome="success")
+                WS_CONNECTIONS.inc()
+                self.connected = True
+                connected_at = time.monotonic()
+                try:
+                    if self.kind == "room" and WS_MULTIPLEX:
+                        await self.send({"type": "subscribe", "room_id": self.key, "room": self.room_name})
+                    await self._read()
+                finally:
+                    self.connected = False
+                    WS_CONNECTIONS.dec()
+                    ws, self.ws = self.ws, None
+                    await ws.close()
+                
+                # Long-lived connections reset the backoff; flapping ones keep growing it
+                if time.monotonic() - connected_at > 30:
+                    attempts = 0
+                else:
+                    attempts += 1
+                    await asyncio.sleep(min(2 ** (attempts - 1), 30))
+        finally:
+            self.hub._link_stopped(self)
+    
+    async def _read(self):
+        """Decode each frame once and hand it to the hub for fan-out."""
+        try:
+            async for message in self.ws:
+                try:
+                    data = json.loads(message)
+                except json.JSONDecodeError as e:
+                    print(f"Invalid JSON: {e}")
+                    continue
+                if not isinstance(data, dict):
+                    continue
+                WS_MESSAGES.inc(direction="in", type=str(data.get("type")))
+                self.hub._publish(self, data)
+        except ConnectionClosed:
+            pass
+
+
+class WebSocketHub:
+    """
+    Share upstream WebSocket connections between a worker's sessions.
+    
+    Each room with at least one watching session has one upstream link,
+    authenticated with a watching session's token. Its frames are decoded
+    once and queued to every session subscribed to the room. Each user
+    with an attached session also has one link of their own, which
+    carries that user's outgoing frames and the replies addressed to
+    them (acks).
+    
+    A session's user is the one /users/me returns for the session's own
+    token, never an id supplied by the caller or read from the token's
+    claims. Sessions may only subscribe to rooms in the list /rooms/mine
+    returns for their own token; room names for link URLs come from that
+    list too.
+    Events addressed to specific users are delivered only to those users'
+    sessions. Queued events are shared between sessions and must be
+    treated as read-only.
+    """
+    
+    def __init__(self):
+        self._sessions: Dict[str, _Session] = {}
+        self._room_links: Dict[int, _Link] = {}
+        self._user_links: Dict[object, _Link] = {}
+        # Token hash -> (fetched at, room id -> room name) from /rooms/mine
+        self._granted_rooms: Dict[str, Tuple[float, Dict[int, str]]] = {}
+        # Token hash -> (fetched at, user id) from /users/me
+        self._identities: Dict[str, Tuple[float, object]] = {}
+        
+        # Counters
+        self.events_in = 0
+        self.events_out = 0
+    
+    async def attach(self, session_id: str, token: str, callback: Callable) -> Optional[bool]:
+        """
+        Register a session, or update its token and callback.
+        
+        The session's user (for event filtering and the per-user link) is
+        looked up with the token itself.
+        
+        Args:
+            session_id: Browser session (client token)
+            token: The user's access token, used to identify the user and (re)authenticate links
+            callback: Coroutine function called with each event for the session
+        
+        Returns:
+            Whether the session is new (it has no subscriptions yet); None if
+            the API did not accept the token, in which case nothing is attached
+        """
+        user_id = await self._identity_for(token)
+        if user_id is None:
+            print("Hub attach refused: the API did not accept the session's token")
+            await self.detach(session_id)
+            return None
+        
+        session = self._sessions.get(session_id)
+        if session is not None and session.user_id != user_id:
+            # Another user signed in on this tab
+            await self.detach(session_id)
+            session = None
+        
+        created = session is None
+        if created:
+            session = _Session(session_id, user_id, token, callback)
+            self._sessions[session_id] = session
+            session.pump = asyncio.create_task(self._pump(session))
+        else:
+            session.token = token
+            session.callback = _callback_ref(callback)
+        
+        link = self._user_links.get(user_id)
+        if link is None:
+            link = self._user_links[user_id] = _Link(self, "user", user_id)
+        link.sessions.add(session_id)
+        link.start()
+        return created
+    
+    async def detach(self, session_id: str):
+        """Drop a session and close links nobody else uses."""
+        session = self._sessions.pop(session_id, None)
+        if session is None:
+            return
+        if session.pump is not None and session.pump is not asyncio.current_task():
+            session.pump.cancel()
+        
+        await self.unsubscribe(session_id, list(session.rooms))
+        link = self._user_links.get(session.user_id)
+        if link is not None:
+            link.sessions.discard(session_id)
+            if not link.sessions:
+                del self._user_links[session.user_id]
+                await link.stop()
+    
+    async def subscribe(self, session_id: str, room_ids: Iterable[int]):
+        """
+        Deliver rooms' events to a session.
+        
+        Rooms the session's token is not a member of are skipped.
+        
+        Args:
+            session_id: Attached session
+            room_ids: Rooms to watch
+        """
+        session = self._sessions.get(session_id)
+        if session is None:
+            return
+        room_ids = list(room_ids)
+        granted = await self._rooms_for(session.token)
+        if any(room_id not in granted for room_id in room_ids):
+            # Possibly a room joined since the list was fetched
+            granted = await self._rooms_for(session.token, refresh=True)
+        
+        for room_id in room_ids:
+            room_name = granted.get(room_id)
+            if room_name is None:
+                print(f"Hub subscription to room {room_id} refused: not a member")
+                continue
+            session.rooms[room_id] = room_name
+            link = self._room_links.get(room_id)
+            if link is None:
+                link = self._room_links[room_id] = _Link(self, "room", room_id, room_name)
+            link.sessions.add(session_id)
+            link.start()
+    
+    async def unsubscribe(self, session_id: str, room_ids: Iterable[int]):
+        """Stop delivering rooms' events to a session."""
+        session = self._sessions.get(session_id)
+        for room_id in list(room_ids):
+            if session is not None:
+                session.rooms.pop(room_id, None)
+            link = self._room_links.get(room_id)
+            if link is None:
+                continue
+            link.sessions.discard(session_id)
+            if not link.sessions:
+                del self._room_links[room_id]
+                await link.stop()
+    
+    async def send(self, session_id: str, data: Dict) -> bool:
+        """
+        Send a frame upstream as the session's user.
+        
+        Returns:
+            Whether the frame was sent (False if the user's link is down)
+        """
+        session = self._sessions.get(session_id)
+        if session is None:
+            return False
+        link = self._user_links.get(session.user_id)
+        return link is not None and await link.send(data)
+    
+    async def _identity_for(self, token: str):
+        """
+        User id the API returns from /users/me for a token, or None.
+        
+        Keyed by the token itself; failed lookups are not cached.
+        """
+        if not token:
+            return None
+        key = hashlib.sha256(token.encode()).hexdigest()
+        now = time.monotonic()
+        cached = self._identities.get(key)
+        if cached is not None and now - cached[0] < WS_HUB_ROOMS_TTL:
+            return cached[1]
+        
+        user_id = None
+        try:
+            response = await get_http_client().get(
+                "/users/me", headers={"Authorization": f"Bearer {token}"}
+            )
+            if response.is_success:
+                user = response.json()
+                user_id = user.get("id") if isinstance(user, dict) else None
+        except Exception as e:
+            print(f"Hub could not identify session: {e}")
+        if user_id is None:
+            return None
+        
+        self._identities = {
+            k: v for k, v in self._identities.items() if now - v[0] < WS_HUB_ROOMS_TTL
+        }
+        self._identities[key] = (now, user_id)
+        return user_id
+    
+    async def _rooms_for(self, token: str, refresh: bool = False) -> Dict[int, str]:
+        """
+        Rooms a token may watch, from the API's /rooms/mine.
+        
+        Keyed by the token itself (not its unverified claims). Failed
+        fetches grant nothing.
+        
+        Args:
+            token: Access token of the session
+            refresh: Refetch unless the list is less than a second old
+        """
+        key = hashlib.sha256(token.encode()).hexdigest()
+        now = time.monotonic()
+        cached = self._granted_rooms.get(key)
+        if cached is not None:
+            age = now - cached[0]
+            if age < (WS_HUB_ROOMS_MIN_REFRESH if refresh else WS_HUB_ROOMS_TTL):
+                return cached[1]
+        
+        rooms: Dict[int, str] = {}
+        try:
+            response = await get_http_client().get(
+                "/rooms/mine", headers={"Authorization": f"Bearer {token}"}
+            )
+            if response.is_success:
+                rooms = {
+                    room["id"]: room.get("name") or str(room["id"])
+                    for room in response.json()
+                    if isinstance(room, dict) and "id" in room
+                }
+        except Exception as e:
+            print(f"Hub could not load rooms for authorization: {e}")
+        
+        # Drop expired lists so tokens that went away do not accumulate
+        self._granted_rooms = {
+            k: v for k, v in self._granted_rooms.items() if now - v[0] < WS_HUB_ROOMS_TTL
+        }
+        self._granted_rooms[key] = (now, rooms)
+        return rooms
+    
+    def stats(self) -> Dict[str, int]:
+        """Return link, session and fan-out counters."""
+        return {
+            "sessions": len(self._sessions),
+            "room_links": len(self._room_links),
+            "user_links": len(self._user_links),
+            "connected_links": sum(
+                1 for link in list(self._room_links.values()) + list(self._user_links.values())
+                if link.connected
+            ),
+            "events_in": self.events_in,
+            "events_out": self.events_out,
+        }
+    
+    def _publish(self, link: _Link, data: Dict):
+        """Fan an upstream event out to the link's authorized sessions."""
+        self.events_in += 1
+        if link.kind == "room":
+            # Per-room sockets may omit the room id; routing downstream needs it
+            data.setdefault("room_id", link.key)
+        for session_id in list(link.sessions):
+            session = self._sessions.get(session_id)
+            if session is None:
+                continue
+            if link.kind == "room" and link.key not in session.rooms:
+                continue
+            if not self._visible(data, session.user_id):
+                continue
+            session.offer(data)
+            self.events_out += 1
+    
+    def _visible(self, data: Dict, user_id) -> bool:
+        """Whether an event may be shown to a user (events can name their audience)."""
+        audience = data.get("user_ids")
+        if audience is not None and user_id not in audience:
+            return False
+        recipient = data.get("recipient_id")
+        if recipient is not None and recipient != user_id:
+            return False
+        # Acks only concern the sender
+        if data.get("type") == "message_ack" and data.get("user_id", user_id) != user_id:
+            return False
+        return True
+    
+    async def _pump(self, session: _Session):
+        """Deliver a session's queued events in order until it detaches or is discarded."""
+        while True:
+            event = await session.queue.get()
+            callback = session.callback()
+            if callback is None:
+                # The session's state object is gone
+                await self.detach(session.session_id)
+                return
+            try:
+                await callback(event)
+            except Exception as e:
+                print(f"Error handling message: {e}")
+    
+    def _token_for(self, link: _Link) -> Optional[str]:
+        """Token of the most recently attached session still using a link."""
+        for session_id in reversed(list(self._sessions)):
+            if session_id in link.sessions:
+                return self._sessions[session_id].token
+        return None
+    
+    def _link_stopped(self, link: _Link):
+        """Forget a link whose task ended on its own (no sessions or no token)."""
+        links = self._room_links if link.kind == "room" else self._user_links
+        if links.get(link.key) is link and not link.sessions:
+            del links[link.key]
+
+
+# Worker-wide hub
+ws_hub = WebSocketHub()
+REGISTRY.register_collector("chat_ws_hub", ws_hub.stats)
\ No newline at end of file
@@ -1,14 +1,24 @@
 """Base state with API request handling and token refresh logic."""
 
 import reflex as rx
+import asyncio
 import httpx
-import os
-from typing import Optional, Dict, Any
-from dotenv import load_dotenv
-
-load_dotenv()
-
-API_URL = os.getenv("API_URL", "http://127.0.0.1:8020")
+import time
+from typing import Optional, Dict, Any, AsyncIterator, Callable
+from ..services.circuit_breaker import upstream_guard, CircuitOpenError
+from ..services.coalescer import request_coalescer
+from ..services.http_client import API_URL, HTTP_TIMEOUT, get_http_client
+from ..services.metrics import (
+    UPSTREAM_IN_FLIGHT,
+    UPSTREAM_LATENCY,
+    UPSTREAM_REQUESTS,
+    UPSTREAM_RETRIES,
+    endpoint_template,
+)
+from ..services.response_cache import response_cache, copy_json
+from ..services.uploads import UploadTooLargeError
+from ..services.token_refresh import token_refresher, token_expires_within, token_scope
+from .ws_state import WebSocketState
 
 
 class BaseState(rx.State):
@@ -49,18 +59,39 @@ class BaseState(rx.State):
         json_data: Optional[Dict] = None,
         params: Optional[Dict] = None,
         files: Optional[Dict] = None,
+        content: Optional[Callable[[], AsyncIterator[bytes]]] = None,
+        content_headers: Optional[Dict[str, str]] = None,
         retry_on_401: bool = True,
+        show_errors: bool = True,
     ) -> Optional[Dict[str, Any]]:
         """
         Centralized API request handler with automatic token refresh.
         
+        Access tokens close to their `exp` claim are refreshed before the
+        request is sent, so a 401 retry is only needed as a fallback.
+        
+        GET requests to endpoints listed in `CACHE_TTLS` are served from a
+        per-user cache while fresh and revalidated with If-None-Match once
+        stale. Mutations must call `_invalidate_cache` for what they change.
+        
+        Concurrent identical GETs (same endpoint, params and user) share a
+        single upstream call and its parsed body.
+        
+        Each endpoint has a circuit breaker: after repeated failures calls
+        fail fast with an error message until a probe succeeds. Timeouts
+        follow the endpoint's observed latency instead of a fixed 30s.
+        
         Args:
             method: HTTP method (GET, POST, PUT, DELETE)
             endpoint: API endpoint (e.g., "/users/me")
             json_data: JSON body
             params: Query parameters
             files: Files to upload
+            content: Factory returning a streamed request body (called again
+                if the request is replayed after a token refresh)
+            content_headers: Headers describing the streamed body
             retry_on_401: Whether to retry with refreshed token on 401
+            show_errors: Whether failures are surfaced in `error_message`
             
         Returns:
             Response JSON or None on error
@@ -68,104 +99,223 @@ class BaseState(rx.State):
         url = f"{API_URL}{endpoint}"
         headers = {}
         
+        # Refresh ahead of expiry; the 401 retry below remains the fallback
+        if retry_on_401 and self.refresh_token and token_expires_within(self.access_token):
+            await self._refresh_access_token()
+        
         # Add auth header if token exists
-        if self.access_token:
-            headers["Authorization"] = f"Bearer {self.access_token}"
+        sent_token = self.access_token
+        if sent_token:
+            headers["Authorization"] = f"Bearer {sent_token}"
         
-        async with httpx.AsyncClient(timeout=30.0) as client:
+        # Cached GET responses
+        cache_key = None
+        cache_entry = None
+        cache_ttl = (
+            response_cache.ttl_for(endpoint)
+            if method == "GET" and not files and not content
+            else None
+        )
+        if cache_ttl:
+            cache_key = response_cache.make_key(token_scope(sent_token), endpoint, params)
+            cache_entry = response_cache.get(cache_key)
+            if cache_entry and cache_entry.is_fresh():
+                return cache_entry.value()
+            if cache_entry and cache_entry.etag:
+                headers["If-None-Match"] = cache_entry.etag
+        
+        client = get_http_client()
+        template = endpoint_template(endpoint)
+        breaker = upstream_guard.breaker(template)
+        
+        async def request(timeout: float):
+            if content:
+                # Streamed body
+                response = await client.request(
+                    method=method,
+                    url=url,
+                    headers={**headers, **(content_headers or {})},
+                    content=content(),
+                    params=params,
+                    timeout=timeout,
+                )
+            elif files:
+                # Multipart upload
+                response = await client.request(
+                    method=method,
+                    url=url,
+                    headers=headers,
+                    files=files,
+                    data=json_data,
+                    params=params,
+                    timeout=timeout,
+                )
+            else:
+                # JSON request
+                response = await client.request(
+                    method=method,
+                    url=url,
+                    headers=headers,
+                    json=json_data,
+                    params=params,
+                    timeout=timeout,
+                )
+            return response
+        
+        async def send():
+            # One guarded, instrumented upstream call
+            breaker.before_request()
+            UPSTREAM_IN_FLIGHT.inc(endpoint=template)
+            started = time.perf_counter()
+            status = "error"
             try:
-                if files:
-                    # Multipart upload
-                    response = await client.request(
-                        method=method,
-                        url=url,
-                        headers=headers,
-                        files=files,
-                        data=json_data,
-                        params=params,
-                    )
+                # Uploads scale with file size, so they keep the full timeout
+                response = await request(HTTP_TIMEOUT if files or content else breaker.timeout())
+                status = str(response.status_code)
+            except httpx.RequestError:
+                breaker.record_failure()
+                raise
+            except (Exception, asyncio.CancelledError):
+                breaker.release()
+                raise
+            finally:
+                elapsed = time.perf_counter() - started
+                UPSTREAM_IN_FLIGHT.dec(endpoint=template)
+                UPSTREAM_LATENCY.observe(elapsed, method=method, endpoint=template)
+                UPSTREAM_REQUESTS.inc(method=method, endpoint=template, status=status)
+            
+            if response.status_code >= 500:
+                breaker.record_failure()
+            else:
+                breaker.record_success(elapsed)
+            body = response.json() if response.is_success and response.content else None
+            return response, body
+        
+        try:
+            if method == "GET" and not files and not content:
+                coalesce_key = (
+                    method,
+                    endpoint,
+                    tuple(sorted((params or {}).items())),
+                    # The exact token, never its unverified claims
+                    token_scope(sent_token),
+                )
+                (response, body), shared = await request_coalescer.run(coalesce_key, send)
+            else:
+                (response, body), shared = await send(), False
+            
+            # Handle 401 Unauthorized - Try token refresh
+            if response.status_code == 401 and retry_on_401 and self.refresh_token:
+                if self.access_token and self.access_token != sent_token:
+                    # Another request already refreshed the token meanwhile
+                    token_refresher.record_saved()
+                    refreshed = True
                 else:
-                    # JSON request
-                    response = await client.request(
-                        method=method,
-                        url=url,
-                        headers=headers,
-                        json=json_data,
-                        params=params,
-                    )
-                
-                # Handle 401 Unauthorized - Try token refresh
-                if response.status_code == 401 and retry_on_401 and self.refresh_token:
                     print("Token expired, attempting refresh...")
                     refreshed = await self._refresh_access_token()
-                    
-                    if refreshed:
-                        # Retry the original request
-                        return await self.api_request(
-                            method=method,
-                            endpoint=endpoint,
-                            json_data=json_data,
-                            params=params,
-                            files=files,
-                            retry_on_401=False,  # Don't retry again
-                        )
-                    else:
-                        # Refresh failed, logout
-                        await self.handle_logout()
-                        return None
-                
-                response.raise_for_status()
-                return response.json()
                 
-            except httpx.HTTPStatusError as e:
-                error_detail = e.response.text
-                try:
-                    error_json = e.response.json()
-                    error_detail = error_json.get("detail", error_detail)
-                except:
-                    pass
+                if refreshed:
+                    # Retry the original request
+                    UPSTREAM_RETRIES.inc(method=method, endpoint=template)
+                    return await self.api_request(
+                        method=method,
+                        endpoint=endpoint,
+                        json_data=json_data,
+                        params=params,
+                        files=files,
+                        content=content,
+                        content_headers=content_headers,
+                        retry_on_401=False,  # Don't retry again
+                        show_errors=show_errors,
+                    )
+                else:
+                    # Refresh failed, logout
+                    await self.handle_logout()
+                    return None
+            
+            # Cached body is still current
+            if cache_key and response.status_code == 304:
+                cache_entry = response_cache.revalidate(cache_key, cache_ttl)
+                if cache_entry:
+                    return cache_entry.value()
+                # Entry invalidated while the request was in flight: fetch the body once more
+                headers.pop("If-None-Match", None)
+                (response, body), shared = await send(), False
+            
+            response.raise_for_status()
+            
+            # Every sharer stores; store() copies, so this is safe for shared bodies
+            if cache_key:
+                response_cache.store(cache_key, body, response.headers.get("ETag"), cache_ttl)
+            # A shared body is copied so sessions never hold the same objects
+            return copy_json(body) if shared else body
+            
+        except httpx.HTTPStatusError as e:
+            error_detail = e.response.text
+            try:
+                error_json = e.response.json()
+                error_detail = error_json.get("detail", error_detail)
+            except:
+                pass
+            if show_errors:
                 self.set_error(f"Error: {error_detail}")
-                return None
-                
-            except httpx.RequestError as e:
+            return None
+            
+        except CircuitOpenError as e:
+            if show_errors:
+                self.set_error(
+                    f"Service temporarily unavailable, please retry in {max(1, round(e.retry_after))}s"
+                )
+            return None
+            
+        except UploadTooLargeError as e:
+            if show_errors:
+                self.set_error(str(e))
+            return None
+            
+        except httpx.TimeoutException:
+            if show_errors:
+                self.set_error("The server took too long to respond, please try again")
+            return None
+            
+        except httpx.RequestError as e:
+            if show_errors:
                 self.set_error(f"Connection error: {str(e)}")
-                return None
-                
-            except Exception as e:
+            return None
+            
+        except Exception as e:
+            if show_errors:
                 self.set_error(f"Unexpected error: {str(e)}")
-                return None
+            return None
     
     async def _refresh_access_token(self) -> bool:
         """
         Refresh the access token using refresh token.
         
+        Concurrent callers holding the same refresh token share a single
+        /auth/refresh call and all receive its result.
+        
         Returns:
             True if refresh succeeded, False otherwise
         """
-        url = f"{API_URL}/auth/refresh"
+        data = await token_refresher.refresh(self.refresh_token)
+        if not data:
+            return False
         
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            try:
-                response = await client.post(
-                    url,
-                    json={"refresh_token": self.refresh_token}
-                )
-                
-                if response.status_code == 200:
-                    data = response.json()
-                    self.access_token = data.get("access_token", "")
-                    # Update refresh token if provided
-                    if "refresh_token" in data:
-                        self.refresh_token = data["refresh_token"]
-                    print("Token refreshed successfully")
-                    return True
-                else:
-                    print("Token refresh failed")
-                    return False
-                    
-            except Exception as e:
-                print(f"Token refresh error: {e}")
-                return False
+        self.access_token = data.get("access_token", "")
+        # Update refresh token if provided
+        if "refresh_token" in data:
+            self.refresh_token = data["refresh_token"]
+        return True
+    
+    def _invalidate_cache(self, *endpoints: str):
+        """
+        Drop the current user's cached GET responses.
+        
+        Args:
+            endpoints: Endpoints to drop (e.g. "/rooms/mine"); all if empty
+        """
+        response_cache.invalidate(token_scope(self.access_token), *endpoints)
     
     async def check_auth(self):
         """Check if user is authenticated and load profile."""
@@ -186,6 +336,10 @@ class BaseState(rx.State):
     
     async def handle_logout(self):
         """Logout and clear all state."""
+        self._invalidate_cache()
+        # Stop receiving events with the signed-out token
+        ws_state = await self.get_state(WebSocketState)
+        await ws_state.disconnect()
         self.access_token = ""
         self.refresh_token = ""
         self.current_user = None
@@ -1,10 +1,66 @@
 """Chat state management with WebSocket integration."""
 
 import reflex as rx
+from reflex.istate.proxy import StateProxy
+from reflex.utils.format import format_ref
 import asyncio
-from typing import List, Dict, Optional
+import json
+import math
+import os
+import time
+import uuid
+from typing import List, Dict, Optional, Tuple
 from .base_state import BaseState
-from .ws_state import WebSocketState
+from .ws_state import WS_HUB, WS_MULTIPLEX, WebSocketState
+from ..services.metrics import ROOM_CACHE_EVICTIONS, ROOM_CACHE_REQUESTS, ROOM_PREFETCH
+from ..services.outbox import outbox
+from ..services.search_index import SearchIndex, TextIndex, highlight
+from ..services.session_tasks import session_tasks
+from ..services.token_refresh import token_expires_within
+
+# Messages fetched per history page
+MESSAGE_PAGE_SIZE = int(os.getenv("MESSAGE_PAGE_SIZE", "50"))
+
+# Per-session cache of recently viewed rooms' messages
+ROOM_CACHE_MAX_ROOMS = int(os.getenv("ROOM_CACHE_MAX_ROOMS", "10"))
+ROOM_CACHE_MAX_BYTES = int(os.getenv("ROOM_CACHE_MAX_BYTES", str(2 * 1024 * 1024)))
+
+# Rooms whose latest page is prefetched after the dashboard loads
+PREFETCH_ROOMS = int(os.getenv("PREFETCH_ROOMS", "3"))
+PREFETCH_CONCURRENCY = int(os.getenv("PREFETCH_CONCURRENCY", "2"))
+
+# At most one "typing" signal per room per interval (seconds)
+TYPING_SIGNAL_INTERVAL = float(os.getenv("TYPING_SIGNAL_INTERVAL", "2"))
+# Idle time after the last keystroke before "stopped typing" is sent
+TYPING_IDLE_TIMEOUT = float(os.getenv("TYPING_IDLE_TIMEOUT", "3"))
+
+# Seconds a received typing signal stays visible unless refreshed
+TYPING_INDICATOR_TTL = float(os.getenv("TYPING_INDICATOR_TTL", "3"))
+
+# Seconds to wait for the server to acknowledge a message sent over the WebSocket
+WS_ACK_TIMEOUT = float(os.getenv("WS_ACK_TIMEOUT", "3"))
+# WebSocket resends (same client id) before falling back to HTTP
+WS_SEND_RETRIES = int(os.getenv("WS_SEND_RETRIES", "2"))
+
+# Rooms shown for a sidebar search
+ROOM_SEARCH_LIMIT = int(os.getenv("ROOM_SEARCH_LIMIT", "50"))
+
+# Results shown for an in-room message search
+MESSAGE_SEARCH_LIMIT = int(os.getenv("MESSAGE_SEARCH_LIMIT", "50"))
+# Older pages loaded at most to jump to a result that is not loaded yet
+MESSAGE_SEARCH_MAX_PAGES = int(os.getenv("MESSAGE_SEARCH_MAX_PAGES", "20"))
+# Seconds the query must stay unchanged before the server is searched
+MESSAGE_SEARCH_DEBOUNCE = float(os.getenv("MESSAGE_SEARCH_DEBOUNCE", "0.4"))
+
+# DOM id of the virtualized message list; Reflex keeps its handle in refs
+MESSAGE_LIST_ID = "message-scroller"
+
+# Tail length below which appends are never compacted into history
+MESSAGE_TAIL_MIN = 32
+
+# Virtualized list index of the first loaded message; counts down as
+# older pages are prepended so the viewport stays on the same message
+FIRST_MESSAGE_INDEX = 1_000_000
 
 
 class ChatState(BaseState):
@@ -14,10 +70,40 @@ class ChatState(BaseState):
     rooms: List[Dict] = []
     users: List[Dict] = []
     
+    # Live sidebar fields per room, kept apart from `rooms` so that a new
+    # message updates one small entry instead of resending every room:
+    # room id (as str) -> {"last_message", "unread_count", "rank"}.
+    # Rooms are shown in ascending rank; activity moves a room to the top
+    # by giving it the next lower rank, so nothing is re-sorted.
+    room_activity: Dict[str, Dict] = {}
+    _next_room_rank: int = -1
+    
     # Current chat
     current_room_id: Optional[int] = None
     current_room_name: Optional[str] = None
-    messages: List[Dict] = []
+    # Loaded messages, oldest first, sent to the browser in two segments so
+    # that a new message does not resend the whole list: `message_history`
+    # only changes on compaction or when older pages load, while appends and
+    # edits go to the short `message_tail`
+    message_history: List[Dict] = []
+    message_tail: List[Dict] = []
+    # Ids of history messages read since the last compaction
+    read_message_ids: List = []
+    
+    # Message id (as str) -> position in history followed by tail
+    _message_index: Dict[str, int] = {}
+    
+    # History pagination
+    has_more_messages: bool = False
+    loading_older_messages: bool = False
+    first_message_index: int = FIRST_MESSAGE_INDEX
+    
+    # Recently viewed rooms, least recently used first:
+    # "{user_id}:{room_id}" -> {"messages", "has_more", "bytes", "search"}
+    _room_cache: Dict[str, Dict] = {}
+    
+    # Last opened room, restored by bootstrap on the next visit
+    last_room_id: str = rx.Cookie("")
     
     # Message input
     message_input: str = ""
@@ -25,6 +111,14 @@ class ChatState(BaseState):
     # Typing indicators
     typing_users: List[str] = []
     
+    # Username -> monotonic time their typing indicator expires, swept by one event
+    _typing_deadlines: Dict[str, float] = {}
+    
+    # Outgoing typing signals: room we last signalled, when, and the last keystroke
+    _typing_room_id: Optional[int] = None
+    _typing_sent_at: float = 0.0
+    _last_keystroke: float = 0.0
+    
     # UI states
     show_new_chat_modal: bool = False
     show_profile_modal: bool = False
@@ -35,6 +129,23 @@ class ChatState(BaseState):
     
     # Search
     search_query: str = ""
+    filtered_rooms: List[Dict] = []
+    
+    # Index over room names and DM usernames, updated when `rooms` changes
+    _room_index: Optional[SearchIndex] = None
+    
+    # In-room message search
+    show_message_search: bool = False
+    message_search_query: str = ""
+    # {"id", "user", "timestamp", "before", "match", "after", "loaded"}
+    message_search_results: List[Dict] = []
+    message_search_loading: bool = False
+    highlighted_message_id: str = ""
+    
+    # Index over the open room's loaded message contents, built in a worker
+    # thread on the first search and kept up to date as messages arrive and
+    # older pages load; cached with the room when it is left
+    _message_search: Optional[TextIndex] = None
     
     # Theme (using cookie instead of LocalStorage for Reflex 0.8)
     theme: str = rx.Cookie("light")
@@ -55,6 +166,124 @@ class ChatState(BaseState):
         """Toggle profile modal."""
         self.show_profile_modal = not self.show_profile_modal
     
+    async def bootstrap(self):
+        """
+        Load the dashboard on mount.
+        
+        Checks auth first, then loads rooms, users and the last-open room's
+        messages concurrently, pushing each result to the page as it arrives.
+        """
+        started = time.perf_counter()
+        timings = {}
+        
+        redirect = await self.check_auth()
+        timings["auth"] = (time.perf_counter() - started) * 1000
+        if redirect or not self.is_authenticated:
+            yield redirect
+            return
+        yield
+        
+        last_room_id = int(self.last_room_id) if self.last_room_id.isdigit() else None
+        last_room_messages = []
+        
+        async def timed(name: str, coro):
+            step_started = time.perf_counter()
+            try:
+                return name, await coro
+            finally:
+                timings[name] = (time.perf_counter() - step_started) * 1000
+        
+        steps = [
+            timed("rooms", self.load_rooms()),
+            timed("users", self.load_users()),
+        ]
+        if last_room_id is not None:
+            steps.append(timed(
+                "messages",
+                self._fetch_message_page(last_room_id, show_errors=False),
+            ))
+        
+        finished = set()
+        for step in asyncio.as_completed(steps):
+            name, result = await step
+            finished.add(name)
+            if name == "messages":
+                last_room_messages = result or []
+            
+            # Reopen the last room once we know it is still one of ours
+            if {"rooms", "messages"} <= finished and self.current_room_id is None:
+                room = next((r for r in self.rooms if r.get("id") == last_room_id), None)
+                if room:
+                    self.current_room_id = room["id"]
+                    self.current_room_name = room.get("name")
+                    self._set_latest_page(last_room_messages)
+            yield
+        
+        if WS_MULTIPLEX or WS_HUB or (self.current_room_id is not None and self.current_room_name):
+            await self.connect_websocket(self.current_room_name)
+        
+        timings["total"] = (time.perf_counter() - started) * 1000
+        print("Bootstrap timing: " + ", ".join(
+            f"{name}={ms:.1f}ms" for name, ms in timings.items()
+        ))
+        
+        # Resume delivering messages queued before a reload or restart
+        if outbox.pending(self._outbox_owner()):
+            yield ChatState.flush_outbox
+        
+        # Warm the cache for the rooms the user is likely to open next
+        yield ChatState.prefetch_rooms
+    
+    @rx.event(background=True)
+    async def prefetch_rooms(self):
+        """
+        Cache the latest page of the likeliest next rooms.
+        
+        Rooms with unread messages come first, then the most recently active.
+        Runs at most PREFETCH_CONCURRENCY requests at a time and is cancelled
+        by any explicit action (see `_cancel_prefetch`).
+        """
+        async with self:
+            self._cancel_prefetch()
+            session_tasks.claim(self._session_key(), "prefetch")
+            candidates = [
+                room["id"]
+                for room in self._prefetch_candidates()
+                if self._room_cache_key(room["id"]) not in self._room_cache
+            ]
+        
+        semaphore = asyncio.Semaphore(PREFETCH_CONCURRENCY)
+        
+        async def prefetch(room_id: int):
+            async with semaphore:
+                page = await self._fetch_message_page(room_id, show_errors=False, retry_on_401=False)
+            if page is None:
+                ROOM_PREFETCH.inc(outcome="error")
+                return
+            async with self:
+                # The user may have opened the room meanwhile
+                if room_id == self.current_room_id:
+                    ROOM_PREFETCH.inc(outcome="unused")
+                    return
+                self._cache_room(room_id, page, len(page) >= MESSAGE_PAGE_SIZE)
+            ROOM_PREFETCH.inc(outcome="cached")
+        
+        try:
+            await asyncio.gather(*(prefetch(room_id) for room_id in candidates))
+        except asyncio.CancelledError:
+            ROOM_PREFETCH.inc(outcome="cancelled")
+    
+    def _prefetch_candidates(self) -> List[Dict]:
+        """Rooms worth prefetching, best first (the open room excluded)."""
+        rooms = [room for room in self.rooms if room.get("id") != self.current_room_id]
+        activity = {room.get("id"): self._room_activity(room.get("id")) for room in rooms}
+        rooms.sort(key=lambda room: (-activity[room.get("id")]["unread_count"], activity[room.get("id")]["rank"]))
+        return rooms[:PREFETCH_ROOMS]
+    
+    def _cancel_prefetch(self):
+        """Stop a running prefetch so it does not compete with user actions."""
+        session_tasks.cancel(self._session_key(), "prefetch")
+    
     async def load_rooms(self):
         """Load user's chat rooms."""
         if not self.is_authenticated:
@@ -63,6 +292,303 @@ class ChatState(BaseState):
         rooms_data = await self.api_request("GET", "/rooms/mine")
         if rooms_data:
             self.rooms = rooms_data
+            self._sync_room_activity()
+            self._refresh_room_index()
+    
+    def _sync_room_activity(self):
+        """
+        Match `room_activity` to `rooms`.
+        
+        New rooms start from the server's fields in the server's order;
+        rooms already tracked keep their live entry, which is at least as
+        fresh as a (possibly cached) room list.
+        """
+        activity = {}
+        for i, room in enumerate(self.rooms):
+            key = str(room.get("id"))
+            activity[key] = self.room_activity.get(key) or {
+                "last_message": room.get("last_message") or "No messages yet",
+                "unread_count": room.get("unread_count") or 0,
+                "rank": i,
+            }
+        self.room_activity = activity
+    
+    def _room_activity(self, room_id) -> Dict:
+        """A room's live sidebar fields."""
+        return self.room_activity.get(str(room_id)) or {
+            "last_message": "No messages yet",
+            "unread_count": 0,
+            "rank": 0,
+        }
+    
+    def _touch_room(self, room_id, last_message: Optional[str] = None, unread: int = 0):
+        """
+        Record activity in a room and move it to the top of the sidebar.
+        
+        Args:
+            room_id: Room with activity
+            last_message: New preview text (unchanged if None)
+            unread: Messages to add to the unread count
+        """
+        key = str(room_id)
+        if key not in self.room_activity:
+            return
+        entry = dict(self.room_activity[key])
+        if last_message is not None:
+            entry["last_message"] = last_message
+        entry["unread_count"] += unread
+        entry["rank"] = self._next_room_rank
+        self._next_room_rank -= 1
+        self.room_activity[key] = entry
+    
+    def _mark_room_read(self, room_id):
+        """Clear a room's unread badge."""
+        key = str(room_id)
+        if self.room_activity.get(key, {}).get("unread_count"):
+            self.room_activity[key] = {**self.room_activity[key], "unread_count": 0}
+    
+    def _insert_room(self, room: Dict):
+        """Add a room created or joined in this session at the top of the list."""
+        if all(existing.get("id") != room.get("id") for existing in self.rooms):
+            self.rooms.append(room)
+            self.room_activity[str(room.get("id"))] = {
+                "last_message": room.get("last_message") or "No messages yet",
+                "unread_count": 0,
+                "rank": self._next_room_rank,
+            }
+            self._next_room_rank -= 1
+            if self._room_index is None:
+                self._refresh_room_index()
+            else:
+                # One new document; no need to re-diff every room
+                self._room_index.add(room.get("id"), self._room_search_text(room))
+                self._filter_rooms()
+        else:
+            self._touch_room(room.get("id"))
+    
+    def set_search_query(self, query: str):
+        """Filter the sidebar room list."""
+        self.search_query = query
+        self._filter_rooms()
+    
+    def _refresh_room_index(self):
+        """Bring the room search index up to date with `rooms`."""
+        if self._room_index is None:
+            self._room_index = SearchIndex()
+        self._room_index.update(
+            (room.get("id"), self._room_search_text(room)) for room in self.rooms
+        )
+        self._filter_rooms()
+    
+    def _room_search_text(self, room: Dict) -> str:
+        """Searchable text for a room: its name plus the other member of a DM."""
+        parts = [room.get("name") or ""]
+        for field in ("display_name", "other_username", "username"):
+            if isinstance(room.get(field), str):
+                parts.append(room[field])
+        return " ".join(parts)
+    
+    def _filter_rooms(self):
+        """Recompute `filtered_rooms` for the current search query."""
+        if not self.search_query.strip() or self._room_index is None:
+            self.filtered_rooms = []
+            return
+        by_id = {room.get("id"): room for room in self.rooms}
+        self.filtered_rooms = [
+            by_id[room_id]
+            for room_id in self._room_index.search(self.search_query, ROOM_SEARCH_LIMIT)
+            if room_id in by_id
+        ]
+    
+    def toggle_message_search(self):
+        """Show or hide the in-room message search."""
+        if self.show_message_search:
+            self._reset_message_search()
+        else:
+            self.show_message_search = True
+    
+    def _reset_message_search(self):
+        """Close the message search and forget its results."""
+        self.show_message_search = False
+        self.message_search_query = ""
+        self.message_search_results = []
+        self.message_search_loading = False
+        self.highlighted_message_id = ""
+    
+    def set_message_search_query(self, query: str):
+        """
+        Search the open room's messages.
+        
+        Loaded messages are searched locally at once; if older history is
+        not loaded, the server is asked as well once typing pauses, and its
+        matches appended.
+        """
+        self.message_search_query = query
+        if query.strip() and self._message_search is None and self.current_room_id is not None:
+            # First search over these messages; index them off the event loop
+            self.message_search_results = []
+            self.message_search_loading = True
+            return ChatState.build_message_search(self.current_room_id)
+        return self._search_messages(query)
+    
+    def _search_messages(self, query: str):
+        """Show the loaded matches for a query, and ask the server for older ones."""
+        self.message_search_results = self._search_loaded_messages(query)
+        self.message_search_loading = False
+        
+        if query.strip() and self.has_more_messages and self.current_room_id is not None:
+            self.message_search_loading = True
+            return ChatState.search_older_messages(self.current_room_id, query)
+    
+    @rx.event(background=True)
+    async def build_message_search(self, room_id: int):
+        """
+        Index the open room's loaded messages in a worker thread.
+        
+        Tokenizing a long history takes seconds, so it runs outside the
+        state lock and off the event loop; messages loaded or changed
+        meanwhile are then applied to the new index, and the current
+        query is searched.
+        """
+        if not session_tasks.claim(self._session_key(), f"build_message_search:{room_id}"):
+            return
+        async with self:
+            if self.current_room_id != room_id or self._message_search is not None:
+                return
+            documents = self._message_documents()
+        
+        index = TextIndex()
+        await asyncio.to_thread(index.rebuild, documents)
+        
+        async with self:
+            if self.current_room_id != room_id or self._message_search is not None:
+                return
+            self._catch_up_message_search(index, documents)
+            self._message_search = index
+            return self._search_messages(self.message_search_query)
+    
+    def _message_documents(self) -> List[Tuple[str, str]]:
+        """(key, text) pairs of the loaded messages, oldest first, as indexed for search."""
+        return [(str(msg.get("id")), msg.get("content") or "") for msg in self._loaded_messages()]
+    
+    def _catch_up_message_search(self, index: TextIndex, documents: List[Tuple[str, str]]):
+        """Bring an index built from `documents` up to date with the loaded messages."""
+        current = self._message_documents()
+        if current == documents:
+            return
+        
+        indexed = dict(documents)
+        # Leading messages the index has not seen are older pages loaded since
+        older = 0
+        while older < len(current) and current[older][0] not in indexed:
+            older += 1
+        index.prepend(current[:older])
+        
+        loaded = set()
+        for key, text in current[older:]:
+            loaded.add(key)
+            if indexed.get(key) != text:
+                index.add(key, text)
+        for key, _ in documents:
+            if key not in loaded:
+                index.remove(key)
+    
+    def _search_loaded_messages(self, query: str) -> List[Dict]:
+        """Search results among the loaded messages, newest first."""
+        if not query.strip() or self._message_search is None:
+            return []
+        
+        results = []
+        for key in self._message_search.search(query, MESSAGE_SEARCH_LIMIT):
+            position = self._message_position(key)
+            if position is not None:
+                results.append(self._message_search_result(self._message_at(position), query, True))
+        return results
+    
+    def _message_search_result(self, message: Dict, query: str, loaded: bool) -> Dict:
+        """A search result row with the first match split out for highlighting."""
+        before, match, after = highlight(message.get("content") or "", query)
+        return {
+            "id": str(message.get("id")),
+            "user": message.get("user") or "",
+            "timestamp": message.get("timestamp") or "",
+            "before": before,
+            "match": match,
+            "after": after,
+            "loaded": loaded,
+        }
+    
+    @rx.event(background=True)
+    async def search_older_messages(self, room_id: int, query: str):
+        """Ask the server for matches in history that is not loaded."""
+        # Debounce: only the query still current after the pause is sent
+        await asyncio.sleep(MESSAGE_SEARCH_DEBOUNCE)
+        async with self:
+            # Entering the lock reloads the state, so this sees newer keystrokes
+            if self.current_room_id != room_id or self.message_search_query != query:
+                return
+        
+        # Read-only request so it can run outside the state lock
+        found = await self.api_request(
+            "GET",
+            "/messages/search",
+            params={"query": query, "room_id": room_id, "limit": MESSAGE_SEARCH_LIMIT},
+            retry_on_401=False,
+            show_errors=False,
+        )
+        
+        async with self:
+            # A newer query or another room supersedes this one
+            if self.current_room_id != room_id or self.message_search_query != query:
+                return
+            self.message_search_loading = False
+            if not found:
+                return
+            
+            shown = {result["id"] for result in self.message_search_results}
+            self.message_search_results = self.message_search_results + [
+                self._message_search_result(msg, query, self._message_position(msg.get("id")) is not None)
+                for msg in found
+                if str(msg.get("id")) not in shown and msg.get("room_id", room_id) == room_id
+            ]
+    
+    async def jump_to_message(self, message_id: str):
+        """Scroll to a search result, loading older pages first if needed."""
+        room_id = self.current_room_id
+        if (
+            room_id is not None
+            and self._message_position(message_id) is None
+            and self.has_more_messages
+            and not self.loading_older_messages
+        ):
+            self._cancel_prefetch()
+            self.loading_older_messages = True
+            yield
+            
+            for _ in range(MESSAGE_SEARCH_MAX_PAGES):
+                if self._message_position(message_id) is not None or not self.has_more_messages:
+                    break
+                if not await self._prepend_older_page(room_id):
+                    break
+            self.loading_older_messages = False
+            self.message_search_results = [
+                {**result, "loaded": self._message_position(result["id"]) is not None}
+                for result in self.message_search_results
+            ]
+        
+        position = self._message_position(message_id)
+        if position is None:
+            self.set_error("That message is too far back to show")
+            return
+        
+        self.highlighted_message_id = str(message_id)
+        yield
+        # Virtuoso's scrollToIndex takes the position in `data`, not the
+        # first_item_index-based one
+        yield rx.call_script(
+            f"requestAnimationFrame(() => refs['{format_ref(MESSAGE_LIST_ID)}']?.current"
+            f"?.scrollToIndex({{index: {position}, align: 'center', behavior: 'smooth'}}))"
+        )
     
     async def load_users(self):
         """Load all users for DM."""
@@ -78,10 +604,38 @@ class ChatState(BaseState):
             ]
     
     async def select_room(self, room_id: int, room_name: str):
-        """Select a chat room and load messages."""
+        """
+        Select a chat room and load messages.
+        
+        Recently viewed rooms render from the session's cache at once and
+        are then refreshed in the background.
+        """
+        self._cancel_prefetch()
+        self._stash_current_room()
+        
         self.current_room_id = room_id
         self.current_room_name = room_name
-        self.messages = []
+        self.last_room_id = str(room_id)
+        self._mark_room_read(room_id)
+        self._typing_deadlines = {}
+        self.typing_users = []
+        self._reset_message_search()
+        
+        cached = self._cached_room(room_id)
+        if cached:
+            # The index moves to the open room and is cached again when it is left
+            self._set_messages(list(cached["messages"]), cached.pop("search", None))
+            self.has_more_messages = cached["has_more"]
+            self.first_message_index = FIRST_MESSAGE_INDEX
+            self._show_outbox_rows()
+            yield
+            
+            await self.connect_websocket(room_name)
+            yield ChatState.refresh_room_messages(room_id)
+            return
+        
+        self._set_messages([])
+        self.has_more_messages = False
         
         # Load message history
         await self.load_messages(room_id)
@@ -89,59 +643,393 @@ class ChatState(BaseState):
         # Connect WebSocket
         await self.connect_websocket(room_name)
     
+    @rx.event(background=True)
+    async def refresh_room_messages(self, room_id: int):
+        """Fetch the latest page of a room shown from cache and merge it in."""
+        # Read-only request so it can run outside the state lock
+        page = await self._fetch_message_page(room_id, show_errors=False, retry_on_401=False)
+        if page is None:
+            return
+        
+        async with self:
+            if self.current_room_id == room_id:
+                self._merge_latest_page(page)
+    
+    def _merge_latest_page(self, page: List[Dict]):
+        """Append new messages from a fresh latest page and apply changed fields."""
+        if page and len(page) >= MESSAGE_PAGE_SIZE and self._message_position(page[0].get("id")) is None:
+            # More than a page arrived since the room was cached; the pages
+            # would not be contiguous, so start over from the latest page
+            self._set_latest_page(page)
+            return
+        
+        for msg in page:
+            position = self._message_position(msg.get("id"))
+            if position is None:
+                self._append_message(msg)
+                continue
+            current = self._message_at(position)
+            changes = {k: v for k, v in msg.items() if current.get(k) != v}
+            if changes:
+                self._update_message(msg.get("id"), changes)
+    
+    def _room_cache_key(self, room_id) -> str:
+        """Cache key scoped to the signed-in user."""
+        user_id = (self.current_user or {}).get("id")
+        return f"{user_id}:{room_id}"
+    
+    def _cached_room(self, room_id) -> Optional[Dict]:
+        """Take a room's cached messages, marking it most recently used."""
+        entry = self._room_cache.pop(self._room_cache_key(room_id), None)
+        if entry is None:
+            ROOM_CACHE_REQUESTS.inc(result="miss")
+            return None
+        
+        ROOM_CACHE_REQUESTS.inc(result="hit")
+        self._room_cache[self._room_cache_key(room_id)] = entry
+        return entry
+    
+    def _stash_current_room(self):
+        """Cache the room being left so switching back is instant."""
+        if self.current_room_id is None:
+            return
+        messages = self._loaded_messages()
+        if messages:
+            self._cache_room(self.current_room_id, messages, self.has_more_messages, self._message_search)
+    
+    def _cache_room(self, room_id, messages: List[Dict], has_more: bool, search: Optional[TextIndex] = None):
+        """Store a room's messages (and search index), evicting least recently used rooms over the caps."""
+        key = self._room_cache_key(room_id)
+        self._room_cache.pop(key, None)
+        
+        size = len(json.dumps(messages, default=str))
+        if size > ROOM_CACHE_MAX_BYTES:
+            ROOM_CACHE_EVICTIONS.inc(reason="too_large")
+            return
+        self._room_cache[key] = {"messages": messages, "has_more": has_more, "bytes": size, "search": search}
+        
+        total = sum(entry["bytes"] for entry in self._room_cache.values())
+        while len(self._room_cache) > ROOM_CACHE_MAX_ROOMS or total > ROOM_CACHE_MAX_BYTES:
+            oldest = next(iter(self._room_cache))
+            total -= self._room_cache.pop(oldest)["bytes"]
+            ROOM_CACHE_EVICTIONS.inc(reason="capacity")
+    
+    def _update_cached_room(self, room_id, data: Dict):
+        """Apply a WebSocket event for a room that is cached but not open."""
+        entry = self._room_cache.get(self._room_cache_key(room_id))
+        if entry is None:
+            return
+        
+        messages = entry["messages"]
+        if data.get("type") == "message":
+            if all(msg.get("id") != data.get("id") for msg in messages[-MESSAGE_PAGE_SIZE:]):
+                message = self._ws_message(data)
+                messages.append(message)
+                entry["bytes"] += len(json.dumps(message, default=str))
+                if entry.get("search") is not None:
+                    entry["search"].add(str(message.get("id")), message.get("content") or "")
+        elif data.get("type") == "message_read":
+            for i, msg in enumerate(messages):
+                if msg.get("id") == data.get("message_id"):
+                    messages[i] = {**msg, "is_read": True}
+                    break
+    
     async def load_messages(self, room_id: int):
-        """Load message history for a room."""
-        messages_data = await self.api_request("GET", f"/messages/{room_id}")
-        if messages_data:
-            self.messages = messages_data
+        """Load the latest page of message history for a room."""
+        page = await self._fetch_message_page(room_id)
+        if page is not None:
+            self._set_latest_page(page)
     
-    async def connect_websocket(self, room_name: str):
-        """Connect to WebSocket for real-time updates."""
+    async def load_older_messages(self):
+        """Prepend the page of history before the oldest loaded message."""
+        self._cancel_prefetch()
+        if (
+            not self.has_more_messages
+            or self.loading_older_messages
+            or self.current_room_id is None
+            or self._oldest_message_id() is None
+        ):
+            return
+        
+        self.loading_older_messages = True
+        yield
+        
+        await self._prepend_older_page(self.current_room_id)
+        self.loading_older_messages = False
+    
+    def _oldest_message_id(self):
+        """Id of the oldest loaded message the server knows about."""
+        return next(
+            (
+                msg.get("id")
+                for msg in list(self.message_history) + list(self.message_tail)
+                if not str(msg.get("id")).startswith("temp-")
+            ),
+            None,
+        )
+    
+    async def _prepend_older_page(self, room_id: int) -> bool:
+        """
+        Fetch the page before the oldest loaded message and prepend it.
+        
+        Returns:
+            Whether any messages were added
+        """
+        page = await self._fetch_message_page(room_id, before_id=self._oldest_message_id())
+        if page is None or self.current_room_id != room_id:
+            return False
+        
+        # Servers that ignore the cursor return pages we already have
+        older = [msg for msg in page if self._message_position(msg.get("id")) is None]
+        self.has_more_messages = len(page) >= MESSAGE_PAGE_SIZE and len(older) > 0
+        if older:
+            search = self._message_search
+            self._set_messages(older + self._loaded_messages(), search)
+            if search is not None:
+                search.prepend((str(msg.get("id")), msg.get("content") or "") for msg in older)
+            self.first_message_index -= len(older)
+        return len(older) > 0
+    
+    async def _fetch_message_page(
+        self,
+        room_id: int,
+        before_id=None,
+        show_errors: bool = True,
+        retry_on_401: bool = True,
+    ) -> Optional[List[Dict]]:
+        """
+        Fetch one page of a room's history, oldest message first.
+        
+        Args:
+            room_id: Room to read
+            before_id: Only return messages older than this id (latest page if None)
+            show_errors: Surface request errors to the user
+            retry_on_401: Refresh the token if needed (False for background
+                tasks, which must not write state outside `async with self`)
+        
+        Returns:
+            Up to MESSAGE_PAGE_SIZE messages, or None if the request failed
+        """
+        params = {"limit": MESSAGE_PAGE_SIZE}
+        if before_id is not None:
+            params["before_id"] = before_id
+        
+        return await self.api_request(
+            "GET",
+            f"/messages/{room_id}",
+            params=params,
+            retry_on_401=retry_on_401,
+            show_errors=show_errors,
+        )
+    
+    def _set_latest_page(self, page: List[Dict]):
+        """Show the latest page of a room's history."""
+        self._set_messages(page)
+        self.has_more_messages = len(page) >= MESSAGE_PAGE_SIZE
+        self.first_message_index = FIRST_MESSAGE_INDEX
+        self._show_outbox_rows()
+    
+    def _set_messages(self, messages: List[Dict], search: Optional[TextIndex] = None):
+        """
+        Replace the loaded messages and rebuild the id index.
+        
+        Args:
+            messages: The new loaded messages, oldest first
+            search: Search index already covering `messages`, if any; without
+                one the index is rebuilt on the next search
+        """
+        self.message_history = messages
+        self.message_tail = []
+        self.read_message_ids = []
+        self._reindex_messages()
+        self._message_search = search
+    
+    def _loaded_messages(self) -> List[Dict]:
+        """All loaded messages, oldest first, with pending read receipts applied."""
+        read = set(str(message_id) for message_id in self.read_message_ids)
+        return [
+            {**msg, "is_read": True} if str(msg.get("id")) in read else msg
+            for msg in self.message_history
+        ] + list(self.message_tail)
+    
+    def _reindex_messages(self):
+        """Rebuild the id index over history followed by tail."""
+        self._message_index = {
+            str(msg.get("id")): i
+            for i, msg in enumerate(list(self.message_history) + list(self.message_tail))
+        }
+    
+    def _message_at(self, position: int) -> Dict:
+        """Message at a position in history followed by tail."""
+        history_length = len(self.message_history)
+        if position < history_length:
+            return self.message_history[position]
+        return self.message_tail[position - history_length]
+    
+    def _append_message(self, message: Dict):
+        """Append a message to the tail and index it."""
+        self._message_index[str(message.get("id"))] = len(self.message_history) + len(self.message_tail)
+        self.message_tail.append(message)
+        if self._message_search is not None:
+            self._message_search.add(str(message.get("id")), message.get("content") or "")
+        
+        # Fold the tail into history once it outgrows ~sqrt(2n): appends then
+        # ship O(sqrt n) rows on average instead of the whole list
+        if len(self.message_tail) > max(MESSAGE_TAIL_MIN, math.isqrt(2 * len(self.message_history))):
+            self._compact_messages()
+    
+    def _compact_messages(self):
+        """Move the tail and pending read receipts into history."""
+        self.message_history = self._loaded_messages()
+        self.message_tail = []
+        self.read_message_ids = []
+    
+    def _message_position(self, message_id) -> Optional[int]:
+        """Position of a loaded message, or None if it is not loaded."""
+        key = str(message_id)
+        position = self._message_index.get(key)
+        if position is not None and position < len(self.message_history) + len(self.message_tail):
+            if str(self._message_at(position).get("id")) == key:
+                return position
+        
+        # Index out of step with the lists (should not happen); rebuild once
+        if position is not None:
+            self._reindex_messages()
+            return self._message_index.get(key)
+        return None
+    
+    def _update_message(self, message_id, changes: Dict) -> bool:
+        """
+        Update a single message in place.
+        
+        Read receipts for history rows go to `read_message_ids` so the large
+        history list is not resent; other changes are written to the row.
+        
+        Args:
+            message_id: Id of the message to update
+            changes: Fields to merge into the message (a new "id" re-keys the index)
+        
+        Returns:
+            Whether the message was found
+        """
+        position = self._message_position(message_id)
+        if position is None:
+            return False
+        
+        history_length = len(self.message_history)
+        current = self._message_at(position)
+        
+        if position < history_length and changes == {"is_read": True}:
+            if not current.get("is_read") and current.get("id") not in self.read_message_ids:
+                self.read_message_ids.append(current.get("id"))
+                if len(self.read_message_ids) > max(MESSAGE_TAIL_MIN, math.isqrt(2 * history_length)):
+                    self._compact_messages()
+            return True
+        
+        updated = {**current, **changes}
+        if position < history_length:
+            self.message_history[position] = updated
+        else:
+            self.message_tail[position - history_length] = updated
+        
+        new_key = str(updated.get("id"))
+        if new_key != str(message_id):
+            self._message_index.pop(str(message_id), None)
+            self._message_index[new_key] = position
+        if self._message_search is not None and ("id" in changes or "content" in changes):
+            self._message_search.remove(str(message_id))
+            self._message_search.add(new_key, updated.get("content") or "")
+        return True
+    
+    async def connect_websocket(self, room_name: Optional[str] = None):
+        """
+        Connect to WebSocket for real-time updates.
+        
+        With WS_MULTIPLEX (or WS_HUB, which shares sockets across the
+        worker) the session is subscribed to all of its rooms, so background
+        rooms' previews and unread counts stay current; otherwise a socket
+        for `room_name` replaces the previous one.
+        """
         # Get WebSocket state
         ws_state = await self.get_state(WebSocketState)
-        await ws_state.connect(
-            token=self.access_token,
-            room_name=room_name,
-            on_message_callback=self.handle_ws_message
-        )
+        if WS_MULTIPLEX or WS_HUB:
+            await ws_state.connect_multiplexed(
+                token=self.access_token,
+                on_message_callback=self.handle_ws_message,
+            )
+            await self._sync_ws_rooms()
+            return
+        
+        if room_name:
+            await ws_state.connect(
+                token=self.access_token,
+                room_name=room_name,
+                on_message_callback=self.handle_ws_message
+            )
+    
+    async def _sync_ws_rooms(self):
+        """
+        Subscribe the multiplexed socket to exactly the user's rooms.
+        
+        Only rooms from `rooms` (the API's list) are used, never the
+        client-supplied arguments of `select_room`.
+        """
+        rooms = [(room.get("id"), room.get("name")) for room in self.rooms]
+        ws_state = await self.get_state(WebSocketState)
+        await ws_state.set_subscriptions(rooms)
     
     async def handle_ws_message(self, data: Dict):
         """Handle incoming WebSocket messages."""
         msg_type = data.get("type")
         
+        # Acknowledgement of a message we sent, possibly to a room we have
+        # since left; checked before routing so the echo is not duplicated
+        if msg_type in ("message", "message_ack") and self._resolve_ack(data):
+            return
+        
+        # Events for another room only update that room's cached messages
+        # and its sidebar entry
+        room_id = data.get("room_id")
+        if room_id is not None and room_id != self.current_room_id:
+            self._update_cached_room(room_id, data)
+            if msg_type == "message":
+                own = data.get("user_id") == (self.current_user or {}).get("id")
+                self._touch_room(room_id, data.get("content"), unread=0 if own else 1)
+            return
+        
+        if msg_type == "resync":
+            # Events were dropped while this session lagged; catch up
+            await self._resync_current_room()
+            return
+        
         if msg_type == "message":
             # New message received
-            message = {
-                "id": data.get("id"),
-                "content": data.get("content"),
-                "user": data.get("user"),
-                "user_id": data.get("user_id"),
-                "timestamp": data.get("timestamp"),
-                "is_read": data.get("is_read", False),
-                "attachment_url": data.get("attachment_url"),
-                "status": "sent",
-            }
+            message = self._ws_message(data)
             
             # Check if it's not our own message (optimistic UI)
             if message["user_id"] != self.current_user["id"]:
-                self.messages.append(message)
+                if self._message_position(message["id"]) is None:
+                    self._append_message(message)
+                    self._touch_room(self.current_room_id, message["content"])
+                # The sender is done typing
+                self._clear_typing(message["user"])
         
         elif msg_type == "typing":
             # Typing indicator
             username = data.get("user")
-            if username and username != self.current_user["username"]:
+            if data.get("is_typing") is False:
+                # Trailing "stopped typing" signal
+                self._clear_typing(username)
+            elif username and username != self.current_user["username"]:
+                # Repeat signals push the deadline back
+                self._typing_deadlines[username] = time.monotonic() + TYPING_INDICATOR_TTL
                 if username not in self.typing_users:
                     self.typing_users.append(username)
-                    # Remove after 3 seconds
-                    asyncio.create_task(self._remove_typing_indicator(username))
+                self._start_typing_sweeper()
         
         elif msg_type == "message_read":
             # Update read receipt
-            message_id = data.get("message_id")
-            self.messages = [
-                {**msg, "is_read": True} if msg["id"] == message_id else msg
-                for msg in self.messages
-            ]
+            self._update_message(data.get("message_id"), {"is_read": True})
         
         elif msg_type == "system":
             # System message (user joined/left)
@@ -150,23 +1038,122 @@ class ChatState(BaseState):
             # Could add system messages to chat
             print(f"System: {user} {action}")
     
-    async def _remove_typing_indicator(self, username: str):
-        """Remove typing indicator after 3 seconds."""
-        await asyncio.sleep(3)
-        self.typing_users = [u for u in self.typing_users if u != username]
+    async def _resync_current_room(self):
+        """Reload the open room's latest page after missed WebSocket events."""
+        self._typing_deadlines = {}
+        self.typing_users = []
+        room_id = self.current_room_id
+        if room_id is None:
+            return
+        page = await self._fetch_message_page(room_id, show_errors=False, retry_on_401=False)
+        if page is not None and self.current_room_id == room_id:
+            self._merge_latest_page(page)
+    
+    def _ws_message(self, data: Dict) -> Dict:
+        """Build a message row from a WebSocket "message" event."""
+        return {
+            "id": data.get("id"),
+            "content": data.get("content"),
+            "user": data.get("user"),
+            "user_id": data.get("user_id"),
+            "timestamp": data.get("timestamp"),
+            "is_read": data.get("is_read", False),
+            "attachment_url": data.get("attachment_url"),
+            "status": "sent",
+        }
+    
+    @rx.var
+    def typing_label(self) -> str:
+        """Who is typing, e.g. "Ann and Bob are typing"."""
+        names = self.typing_users
+        if not names:
+            return ""
+        if len(names) == 1:
+            return f"{names[0]} is typing"
+        if len(names) == 2:
+            return f"{names[0]} and {names[1]} are typing"
+        if len(names) == 3:
+            return f"{names[0]}, {names[1]} and {names[2]} are typing"
+        return f"{names[0]}, {names[1]} and {len(names) - 2} others are typing"
+    
+    def _clear_typing(self, username: Optional[str]):
+        """Hide a user's typing indicator now."""
+        self._typing_deadlines.pop(username, None)
+        if username in self.typing_users:
+            self.typing_users = [u for u in self.typing_users if u != username]
+    
+    def _start_typing_sweeper(self):
+        """
+        Start `sweep_typing_indicators` unless it is already running.
+        
+        Typing signals arrive through the WebSocket callback, which is not
+        an event and cannot yield one, so the task is started the way Reflex
+        starts background events: on a StateProxy of this state.
+        """
+        session_tasks.start(
+            self._session_key(),
+            "typing_sweeper",
+            ChatState.sweep_typing_indicators.fn(StateProxy(self)),
+        )
+    
+    @rx.event(background=True)
+    async def sweep_typing_indicators(self):
+        """
+        Expire typing indicators whose deadline has passed.
+        
+        Typing signals arrive through the WebSocket callback, outside any
+        event, so this background event does the expiry: every update
+        happens under the state lock and is pushed to the browser. It
+        sleeps until the earliest deadline and stops once nobody is typing
+        (or on logout); the next typing signal starts it again.
+        """
+        session = self._session_key()
+        if not session_tasks.claim(session, "typing_sweeper"):
+            return
+        while True:
+            async with self:
+                if not self.is_authenticated:
+                    session_tasks.release(session, "typing_sweeper")
+                    self._typing_deadlines = {}
+                    self.typing_users = []
+                    return
+                
+                now = time.monotonic()
+                expired = [u for u, deadline in self._typing_deadlines.items() if deadline <= now]
+                for username in expired:
+                    del self._typing_deadlines[username]
+                # Users removed from the map directly may still be listed
+                listed = [u for u in self.typing_users if u in self._typing_deadlines]
+                if listed != self.typing_users:
+                    self.typing_users = listed
+                
+                if not self._typing_deadlines:
+                    session_tasks.release(session, "typing_sweeper")
+                    return
+                wait = min(self._typing_deadlines.values()) - now
+            await asyncio.sleep(max(wait, 0))
     
     async def send_message(self):
         """Send a message (Optimistic UI)."""
         if not self.message_input.strip() or not self.current_room_id:
             return
         
+        self._cancel_prefetch()
         content = self.message_input.strip()
         self.message_input = ""  # Clear input immediately
         
-        # Optimistic UI: Add message to list
-        temp_id = f"temp-{len(self.messages)}"
+        # Sending ends the typing state without waiting for the idle timeout
+        if self._typing_room_id is not None:
+            room_id = self._typing_room_id
+            self._typing_room_id = None
+            self._typing_sent_at = 0.0
+            await self._send_typing_signal(room_id, False)
+        
+        # Optimistic UI: Add message to list. The client id also lets the
+        # server deduplicate resends and the HTTP fallback.
+        client_id = uuid.uuid4().hex
         temp_message = {
-            "id": temp_id,
+            "id": f"temp-{client_id}",
             "content": content,
             "user": self.current_user["username"],
             "user_id": self.current_user["id"],
@@ -175,38 +1162,307 @@ class ChatState(BaseState):
             "attachment_url": None,
             "status": "sending",
         }
-        self.messages.append(temp_message)
+        self._append_message(temp_message)
+        self._touch_room(self.current_room_id, content)
         
-        # Send to backend
-        response = await self.api_request(
-            "POST",
-            "/messages/room",
-            json_data={
-                "content": content,
-                "room_id": self.current_room_id,
-            }
-        )
+        # Keep order behind messages still waiting in the outbox
+        if outbox.pending(self._outbox_owner(), self.current_room_id):
+            outbox.enqueue(self._outbox_owner(), self.current_room_id, client_id, content)
+            return ChatState.flush_outbox
         
-        if response:
-            # Replace temp message with actual
-            self.messages = [
-                {**response, "status": "sent"} if msg["id"] == temp_id else msg
-                for msg in self.messages
-            ]
-        else:
-            # Mark as failed
-            self.messages = [
-                {**msg, "status": "failed"} if msg["id"] == temp_id else msg
-                for msg in self.messages
-            ]
+        return ChatState.deliver_message(self.current_room_id, client_id, content)
     
-    async def send_typing_indicator(self):
-        """Send typing indicator to other users."""
-        if self.current_room_id:
-            await self.api_request(
+    @rx.event(background=True)
+    async def deliver_message(self, room_id: int, client_id: str, content: str):
+        """
+        Deliver a sent message, preferring the open WebSocket.
+        
+        The frame carries `client_id`; the server's ack (a "message_ack"
+        or the echoed "message" with the same client id) flips the row from
+        "sending" to "sent". Unacknowledged frames are resent up to
+        WS_SEND_RETRIES times, then the message goes over HTTP.
+        """
+        temp_id = f"temp-{client_id}"
+        frame = {
+            "type": "message",
+            "room_id": room_id,
+            "content": content,
+            "client_id": client_id,
+        }
+        
+        # The server's ack resolves this session's future for the client id
+        session = self._session_key()
+        ack = None
+        for _ in range(1 + WS_SEND_RETRIES):
+            async with self:
+                future = session_tasks.future(session, client_id)
+                ws_state = await self.get_state(WebSocketState)
+                sent = await ws_state.send_message(frame)
+            if not sent:
+                break
+            try:
+                ack = await asyncio.wait_for(future, WS_ACK_TIMEOUT)
+                break
+            except asyncio.TimeoutError:
+                print(f"No ack for message {client_id}, resending")
+        
+        async with self:
+            session_tasks.discard(session, client_id)
+            if ack is not None:
+                # Acks may carry only the server id and timestamp
+                fields = {k: v for k, v in self._ws_message(ack).items() if k in ack}
+                self._update_sent_message(room_id, temp_id, {**fields, "status": "sent"})
+                return
+            owner = self._outbox_owner()
+        
+        # Socket down or no ack: send over HTTP, outside the lock
+        response = await self._post_outbox_entry({"room_id": room_id, "client_id": client_id, "content": content})
+        
+        async with self:
+            if response:
+                # Replace temp message with actual
+                self._update_sent_message(room_id, temp_id, {**response, "status": "sent"})
+                return
+            
+            # Mark as failed and keep it for retry
+            self._update_sent_message(room_id, temp_id, {"status": "failed"})
+            outbox.enqueue(owner, room_id, client_id, content, attempts=1)
+        yield ChatState.flush_outbox
+    
+    @rx.event(background=True)
+    async def flush_outbox(self):
+        """
+        Deliver queued messages in order, in batches, until the outbox is empty.
+        
+        Each pass sends up to OUTBOX_BATCH_SIZE due messages over HTTP,
+        outside the state lock. A failure backs that message off with
+        jitter and holds back the rest of its room; the loop then sleeps
+        until the next message is due. Messages are claimed before sending
+        so other tabs or workers flushing the same outbox skip them.
+        """
+        session = self._session_key()
+        if not session_tasks.claim(session, "flush_outbox"):
+            return
+        async with self:
+            owner = self._outbox_owner()
+        claimant = uuid.uuid4().hex
+        
+        while True:
+            batch = outbox.due_batch(owner, claimant=claimant)
+            if not batch:
+                wait = outbox.next_attempt_in(owner, claimant=claimant)
+                if wait is None:
+                    return
+                # `retry_message` wakes us early
+                await session_tasks.sleep(session, "flush_outbox", wait)
+                continue
+            
+            failed_rooms = set()
+            for entry in batch:
+                if entry["room_id"] in failed_rooms:
+                    continue
+                if not outbox.claim(entry["client_id"], claimant):
+                    # Being sent by another flusher; keep the room's order
+                    failed_rooms.add(entry["room_id"])
+                    continue
+                
+                temp_id = f"temp-{entry['client_id']}"
+                async with self:
+                    if self._outbox_owner() != owner:
+                        # Signed out meanwhile
+                        return
+                    self._update_sent_message(entry["room_id"], temp_id, {"status": "sending"})
+                
+                response = await self._post_outbox_entry(entry)
+                if response:
+                    outbox.remove(entry["client_id"])
+                else:
+                    outbox.record_failure(entry["client_id"])
+                    failed_rooms.add(entry["room_id"])
+                
+                async with self:
+                    if response:
+                        self._update_sent_message(entry["room_id"], temp_id, {**response, "status": "sent"})
+                    else:
+                        self._update_sent_message(entry["room_id"], temp_id, {"status": "failed"})
+    
+    async def _post_outbox_entry(self, entry: Dict) -> Optional[Dict]:
+        """
+        POST a message from a background task (the outbox or a WebSocket fallback).
+        
+        The request runs outside the state lock with `retry_on_401=False`;
+        the token is refreshed under the lock when it is about to expire,
+        including once more if the request failed because it expired.
+        """
+        response = None
+        for _ in range(2):
+            async with self:
+                if self.refresh_token and token_expires_within(self.access_token):
+                    if not await self._refresh_access_token():
+                        return None
+            
+            response = await self.api_request(
                 "POST",
-                f"/rooms/{self.current_room_id}/typing"
+                "/messages/room",
+                json_data={
+                    "content": entry["content"],
+                    "room_id": entry["room_id"],
+                    "client_id": entry["client_id"],
+                },
+                retry_on_401=False,
+                show_errors=False,
             )
+            if response is not None or not token_expires_within(self.access_token):
+                break
+        return response
+    
+    def retry_message(self, message_id: str):
+        """Retry a failed message now (and anything queued before it)."""
+        client_id = str(message_id)[len("temp-"):]
+        if not str(message_id).startswith("temp-") or not outbox.retry_now(client_id):
+            return
+        self._update_message(message_id, {"status": "sending"})
+        # A running flusher may be backing off for a while
+        session_tasks.wake(self._session_key(), "flush_outbox")
+        return ChatState.flush_outbox
+    
+    def _outbox_owner(self) -> str:
+        """Outbox key for the signed-in user."""
+        return str((self.current_user or {}).get("id"))
+    
+    def _session_key(self) -> str:
+        """Key for this browser session's background tasks in `session_tasks`."""
+        return self.router.session.client_token
+    
+    def _show_outbox_rows(self):
+        """Add the open room's queued messages that are not on screen yet."""
+        if self.current_room_id is None or not self.current_user:
+            return
+        for entry in outbox.pending(self._outbox_owner(), self.current_room_id):
+            temp_id = f"temp-{entry['client_id']}"
+            if self._message_position(temp_id) is None:
+                self._append_message({
+                    "id": temp_id,
+                    "content": entry["content"],
+                    "user": self.current_user["username"],
+                    "user_id": self.current_user["id"],
+                    "timestamp": "",
+                    "is_read": False,
+                    "attachment_url": None,
+                    "status": "failed" if entry["attempts"] else "sending",
+                })
+    
+    def _resolve_ack(self, data: Dict) -> bool:
+        """
+        Match a server event to a pending WebSocket send.
+        
+        Echoes without a client id are matched to the oldest pending
+        message of ours with the same content in the event's room (the
+        open room's tail, or the room's cached messages if it was left).
+        
+        Returns:
+            Whether the event acknowledged one of our sends
+        """
+        client_id = data.get("client_id")
+        if client_id is None and data.get("user_id") == (self.current_user or {}).get("id"):
+            room_id = data.get("room_id")
+            if room_id is None or room_id == self.current_room_id:
+                candidates = self.message_tail
+            else:
+                entry = self._room_cache.get(self._room_cache_key(room_id)) or {"messages": []}
+                candidates = entry["messages"][-MESSAGE_PAGE_SIZE:]
+            for msg in candidates:
+                msg_id = str(msg.get("id"))
+                if (
+                    msg.get("status") == "sending"
+                    and msg.get("content") == data.get("content")
+                    and session_tasks.pending(self._session_key(), msg_id[len("temp-"):]) is not None
+                ):
+                    client_id = msg_id[len("temp-"):]
+                    break
+        
+        future = session_tasks.pending(self._session_key(), client_id) if client_id else None
+        if future is None:
+            return False
+        if not future.done():
+            future.set_result(data)
+        return True
+    
+    def _update_sent_message(self, room_id: int, temp_id: str, changes: Dict):
+        """Update a sent message's row in the open room or the room cache."""
+        if room_id == self.current_room_id:
+            self._update_message(temp_id, changes)
+            return
+        
+        entry = self._room_cache.get(self._room_cache_key(room_id))
+        if entry is None:
+            return
+        for i, msg in enumerate(entry["messages"]):
+            if msg.get("id") == temp_id:
+                entry["messages"][i] = {**msg, **changes}
+                break
+    
+    async def send_typing_indicator(self):
+        """
+        Send typing indicator to other users.
+        
+        Called on every keystroke but signals at most once per
+        TYPING_SIGNAL_INTERVAL per room; a background watcher sends the
+        trailing "stopped typing" signal once input has been idle for
+        TYPING_IDLE_TIMEOUT.
+        """
+        if not self.current_room_id:
+            return
+        
+        now = time.monotonic()
+        self._last_keystroke = now
+        
+        room_changed = self._typing_room_id != self.current_room_id
+        if room_changed or now - self._typing_sent_at >= TYPING_SIGNAL_INTERVAL:
+            previous_room_id = self._typing_room_id
+            self._typing_room_id = self.current_room_id
+            self._typing_sent_at = now
+            if room_changed and previous_room_id is not None:
+                await self._send_typing_signal(previous_room_id, False)
+            await self._send_typing_signal(self.current_room_id, True)
+        
+        if not session_tasks.running(self._session_key(), "typing_watcher"):
+            return ChatState.typing_stop_watcher
+    
+    @rx.event(background=True)
+    async def typing_stop_watcher(self):
+        """Send "stopped typing" once the input has gone idle."""
+        session = self._session_key()
+        if not session_tasks.claim(session, "typing_watcher"):
+            return
+        while True:
+            async with self:
+                room_id = self._typing_room_id
+                idle_for = time.monotonic() - self._last_keystroke
+                if room_id is None or idle_for >= TYPING_IDLE_TIMEOUT:
+                    session_tasks.release(session, "typing_watcher")
+                    if room_id is not None:
+                        self._typing_room_id = None
+                        self._typing_sent_at = 0.0
+                        await self._send_typing_signal(room_id, False)
+                    return
+            await asyncio.sleep(TYPING_IDLE_TIMEOUT - idle_for)
+    
+    async def _send_typing_signal(self, room_id: int, is_typing: bool):
+        """
+        Signal typing state over the room WebSocket.
+        
+        Falls back to POST /rooms/{id}/typing when the socket is down; the
+        HTTP endpoint has no "stopped" form, so receivers let that expire.
+        """
+        ws_state = await self.get_state(WebSocketState)
+        sent = await ws_state.send_message({
+            "type": "typing",
+            "room_id": room_id,
+            "is_typing": is_typing,
+        })
+        if not sent and is_typing:
+            await self.api_request("POST", f"/rooms/{room_id}/typing", show_errors=False)
     
     def toggle_member(self, username: str):
         """Toggle member selection for group creation."""
@@ -225,6 +1481,8 @@ class ChatState(BaseState):
             self.set_error("Please select at least one member")
             return
         
+        self._cancel_prefetch()
+        
         # Create the room first
         response = await self.api_request(
             "POST",
@@ -243,18 +1501,21 @@ class ChatState(BaseState):
             self.new_room_name = ""
             self.selected_members = []
             self.show_new_chat_modal = False
-            await self.load_rooms()
+            self._invalidate_cache("/rooms/mine")
+            self._insert_room(response)
             
             # Select the newly created room
             room_name = response.get("name")
-            await self.select_room(room_id, room_name)
+            return ChatState.select_room(room_id, room_name)
     
     async def start_dm(self, username: str):
         """Start or get existing DM with a user."""
         if not username:
             self.set_error("Invalid username")
             return
-            
+        
+        self._cancel_prefetch()
+        
         response = await self.api_request(
             "POST",
             f"/rooms/dm/{username}"
@@ -264,8 +1525,9 @@ class ChatState(BaseState):
             room_id = response.get("id")
             room_name = response.get("name")
             self.show_new_chat_modal = False
-            await self.load_rooms()
-            await self.select_room(room_id, room_name)
+            self._invalidate_cache("/rooms/mine")
+            self._insert_room(response)
+            return ChatState.select_room(room_id, room_name)
     
     async def copy_message(self, content: str):
         """Copy message content to clipboard."""
@@ -3,6 +3,18 @@
 import reflex as rx
 from typing import Optional
 from .base_state import BaseState
+from ..services.images import (
+    IMAGE_MAX_INPUT_BYTES,
+    downscale_avatar,
+    image_processing_available,
+)
+from ..services.metrics import UPLOAD_REJECTED
+from ..services.uploads import (
+    AVATAR_MAX_BYTES,
+    format_size,
+    multipart_file_body,
+    upload_size,
+)
 
 
 class ProfileState(BaseState):
@@ -47,6 +59,7 @@ class ProfileState(BaseState):
         )
         
         if response:
+            self._invalidate_cache("/users/me", "/users/")
             self.current_user = response
             self.set_success("Bio updated successfully!")
     
@@ -71,6 +84,7 @@ class ProfileState(BaseState):
         )
         
         if response:
+            self._invalidate_cache("/users/me")
             self.new_password = ""
             self.confirm_password = ""
             self.set_success("Password updated successfully!")
@@ -81,17 +95,43 @@ class ProfileState(BaseState):
             return
         
         file = files[0]
+        size = upload_size(file)
         
-        # Read file data
-        file_data = await file.read()
+        upload = None
         
-        # Upload avatar
-        response = await self.api_request(
-            "POST",
-            "/users/me/avatar",
-            files={"file": (file.filename, file_data, file.content_type)}
-        )
+        # Shrink images to avatar size before uploading
+        if image_processing_available() and (file.content_type or "").startswith("image/"):
+            if size is not None and size > IMAGE_MAX_INPUT_BYTES:
+                UPLOAD_REJECTED.inc(reason="too_large")
+                self.set_error(f"File is too large (max {format_size(IMAGE_MAX_INPUT_BYTES)})")
+                return
+            
+            # Read at most one byte past the limit: the size can be unknown
+            raw = await file.read(IMAGE_MAX_INPUT_BYTES + 1)
+            if len(raw) > IMAGE_MAX_INPUT_BYTES:
+                UPLOAD_REJECTED.inc(reason="too_large")
+                self.set_error(f"File is too large (max {format_size(IMAGE_MAX_INPUT_BYTES)})")
+                return
+            
+            processed = await downscale_avatar(raw, file.filename)
+            if processed:
+                data, filename, content_type = processed
+                upload = {"files": {"file": (filename, data, content_type)}}
+        
+        if upload is None:
+            # Reject oversized files before sending anything
+            if size is not None and size > AVATAR_MAX_BYTES:
+                UPLOAD_REJECTED.inc(reason="too_large")
+                self.set_error(f"File is too large (max {format_size(AVATAR_MAX_BYTES)})")
+                return
+            
+            # Stream the file in chunks instead of reading it into memory
+            headers, body = multipart_file_body(file, "file", max_bytes=AVATAR_MAX_BYTES)
+            upload = {"content": body, "content_headers": headers}
+        
+        response = await self.api_request("POST", "/users/me/avatar", **upload)
         
         if response:
+            self._invalidate_cache("/users/me", "/users/")
             self.current_user = response
             self.set_success("Avatar updated successfully!")
\ No newline at end of file
@@ -3,14 +3,17 @@
 import reflex as rx
 import asyncio
 import json
-import os
-from typing import Optional, Callable, Dict
+import time
+from typing import Optional, Callable, Dict, Iterable, Tuple
 from websockets import connect, ConnectionClosed
-from dotenv import load_dotenv
-
-load_dotenv()
-
-WS_URL = os.getenv("WS_URL", "ws://127.0.0.1:8020")
+from ..services.metrics import (
+    WS_CONNECT_ATTEMPTS,
+    WS_CONNECT_LATENCY,
+    WS_CONNECTIONS,
+    WS_HANDLER_LATENCY,
+    WS_MESSAGES,
+)
+from ..services.ws_hub import WS_HUB, WS_MULTIPLEX, WS_URL, ws_hub
 
 
 class WebSocketState(rx.State):
@@ -23,9 +26,16 @@ class WebSocketState(rx.State):
     
     # Internal non-state variables
     _ws = None
+    _ws_url: Optional[str] = None
     _listen_task = None
     _on_message_callback = None
     
+    # Multiplexed mode: room id -> room name of the rooms subscribed to
+    _rooms: Dict[int, str] = {}
+    
+    # Hub mode: this session's id in the worker's WebSocketHub
+    _hub_session: Optional[str] = None
+    
     async def connect(
         self,
         token: str,
@@ -40,6 +50,10 @@ class WebSocketState(rx.State):
             room_name: Room name to join
             on_message_callback: Callback for incoming messages
         """
+        # Replace the previous room's socket instead of leaking it
+        await self._close()
+        self._rooms = {}
+        
         self.should_reconnect = True
         self.reconnect_attempts = 0
         
@@ -47,28 +61,114 @@ class WebSocketState(rx.State):
         self._on_message_callback = on_message_callback
         
         # Build WebSocket URL
-        ws_url = f"{WS_URL}/ws?token={token}&room={room_name}"
+        self._ws_url = f"{WS_URL}/ws?token={token}&room={room_name}"
+        
+        await self._connect_with_retry(self._ws_url)
+    
+    async def connect_multiplexed(
+        self,
+        token: str,
+        on_message_callback: Optional[Callable] = None,
+    ):
+        """
+        Open the session's single socket for all rooms, if not already open.
+        
+        Rooms are joined with `subscribe`; events carry their `room_id`.
+        With WS_HUB the session attaches to the worker's hub instead of
+        opening a socket of its own.
         
+        Args:
+            token: JWT access token
+            on_message_callback: Callback for incoming messages
+        """
+        self._on_message_callback = on_message_callback
+        
+        if WS_HUB:
+            self._hub_session = self.router.session.client_token
+            created = await ws_hub.attach(self._hub_session, token, self._handle_frame)
+            if created is None:
+                # Token rejected; the hub identifies users only by their own token
+                self._rooms = {}
+                self.is_connected = False
+                return
+            if created:
+                # New hub session (first attach, or another user signed in):
+                # nothing is subscribed there yet
+                self._rooms = {}
+            self.is_connected = True
+            return
+        
+        ws_url = f"{WS_URL}/ws?token={token}"
+        if self._ws is not None and self.is_connected and self._ws_url == ws_url:
+            return
+        
+        # New token or a per-room socket: start over, keeping subscriptions
+        await self._close()
+        self.should_reconnect = True
+        self.reconnect_attempts = 0
+        self._ws_url = ws_url
         await self._connect_with_retry(ws_url)
     
+    async def subscribe(self, rooms: Iterable[Tuple[int, str]]):
+        """
+        Join rooms on the multiplexed socket.
+        
+        Args:
+            rooms: (room id, room name) pairs; rooms already joined are skipped
+        """
+        for room_id, room_name in rooms:
+            if room_id in self._rooms:
+                continue
+            self._rooms[room_id] = room_name
+            if self._hub_session is not None:
+                # The hub checks membership and takes the name from the API
+                await ws_hub.subscribe(self._hub_session, [room_id])
+            else:
+                await self.send_message({"type": "subscribe", "room_id": room_id, "room": room_name})
+    
+    async def unsubscribe(self, room_ids: Iterable[int]):
+        """Leave rooms on the multiplexed socket."""
+        for room_id in list(room_ids):
+            room_name = self._rooms.pop(room_id, None)
+            if room_name is None:
+                continue
+            if self._hub_session is not None:
+                await ws_hub.unsubscribe(self._hub_session, [room_id])
+            else:
+                await self.send_message({"type": "unsubscribe", "room_id": room_id, "room": room_name})
+    
+    async def set_subscriptions(self, rooms: Iterable[Tuple[int, str]]):
+        """Subscribe to exactly `rooms`, sending frames only for the difference."""
+        rooms = dict(rooms)
+        await self.unsubscribe([room_id for room_id in self._rooms if room_id not in rooms])
+        await self.subscribe(rooms.items())
+    
     async def _connect_with_retry(self, ws_url: str):
         """Connect with exponential backoff retry."""
         while self.should_reconnect and self.reconnect_attempts < self.max_reconnect_attempts:
             try:
                 print(f"Connecting to WebSocket... (Attempt {self.reconnect_attempts + 1})")
                 
+                started = time.perf_counter()
                 self._ws = await connect(
                     ws_url,
                     ping_interval=20,
                     ping_timeout=10,
                 )
+                WS_CONNECT_LATENCY.observe(time.perf_counter() - started)
+                WS_CONNECT_ATTEMPTS.inc(outcome="success")
+                WS_CONNECTIONS.inc()
                 
                 self.is_connected = True
                 self.reconnect_attempts = 0
                 print("WebSocket connected successfully")
                 
-                # Start listening for messages
-                if self._listen_task:
+                # A new connection starts with no rooms joined
+                for room_id, room_name in self._rooms.items():
+                    await self.send_message({"type": "subscribe", "room_id": room_id, "room": room_name})
+                
+                # Start listening for messages (reconnects run inside the old listener)
+                if self._listen_task and self._listen_task is not asyncio.current_task():
                     self._listen_task.cancel()
                 
                 self._listen_task = asyncio.create_task(self._listen())
@@ -76,6 +176,7 @@ class WebSocketState(rx.State):
                 
             except Exception as e:
                 print(f"WebSocket connection failed: {e}")
+                WS_CONNECT_ATTEMPTS.inc(outcome="failure")
                 self.is_connected = False
                 self.reconnect_attempts += 1
                 
@@ -94,40 +195,77 @@ class WebSocketState(rx.State):
             async for message in self._ws:
                 try:
                     data = json.loads(message)
-                    print(f"WebSocket message received: {data.get('type')}")
+                    WS_MESSAGES.inc(direction="in", type=str(data.get("type")))
+                    await self._handle_frame(data)
                     
-                    # Call the message handler
-                    if self._on_message_callback:
-                        await self._on_message_callback(data)
-                        
                 except json.JSONDecodeError as e:
                     print(f"Invalid JSON: {e}")
                 except Exception as e:
                     print(f"Error handling message: {e}")
-                    
-        except ConnectionClosed:
-            print("WebSocket connection closed")
-            self.is_connected = False
             
-            # Attempt reconnection if needed
-            if self.should_reconnect:
-                await self._connect_with_retry(self._ws.remote_address)
-                
+        except ConnectionClosed:
+            pass
+        
         except Exception as e:
             print(f"WebSocket error: {e}")
+            if self.is_connected:
+                WS_CONNECTIONS.dec()
             self.is_connected = False
+            return
+        
+        # Closed by either side (a clean close ends the loop without raising)
+        print("WebSocket connection closed")
+        if self.is_connected:
+            WS_CONNECTIONS.dec()
+        self.is_connected = False
+        
+        # Attempt reconnection if needed
+        if self.should_reconnect:
+            await self._connect_with_retry(self._ws_url)
+    
+    async def _handle_frame(self, data: Dict):
+        """Pass a decoded frame to the message handler."""
+        msg_type = str(data.get("type"))
+        print(f"WebSocket message received: {msg_type}")
+        
+        # Call the message handler
+        if self._on_message_callback:
+            started = time.perf_counter()
+            await self._on_message_callback(data)
+            WS_HANDLER_LATENCY.observe(time.perf_counter() - started, type=msg_type)
     
-    async def send_message(self, data: Dict):
-        """Send a message through WebSocket."""
+    async def send_message(self, data: Dict) -> bool:
+        """
+        Send a message through WebSocket.
+        
+        Returns:
+            Whether the frame was sent (False if the socket is down)
+        """
+        if self._hub_session is not None:
+            return await ws_hub.send(self._hub_session, data)
+        
         if self._ws and self.is_connected:
             try:
                 await self._ws.send(json.dumps(data))
+                WS_MESSAGES.inc(direction="out", type=str(data.get("type")))
+                return True
             except Exception as e:
                 print(f"Failed to send WebSocket message: {e}")
+                WS_CONNECTIONS.dec()
                 self.is_connected = False
+        return False
     
     async def disconnect(self):
         """Disconnect WebSocket."""
+        self._rooms = {}
+        if self._hub_session is not None:
+            await ws_hub.detach(self._hub_session)
+            self._hub_session = None
+        await self._close()
+        print("WebSocket disconnected")
+    
+    async def _close(self):
+        """Stop listening and close the socket, without reconnecting."""
         self.should_reconnect = False
         
         if self._listen_task:
@@ -136,9 +274,12 @@ class WebSocketState(rx.State):
                 await self._listen_task
             except asyncio.CancelledError:
                 pass
+            self._listen_task = None
         
         if self._ws:
             await self._ws.close()
+            self._ws = None
         
-        self.is_connected = False
-        print("WebSocket disconnected")
\ No newline at end of file
+        if self.is_connected:
+            WS_CONNECTIONS.dec()
+        self.is_connected = False
\ No newline at end of file
@@ -0,0 +1,108 @@
+"""
+Benchmark: bytes sent to the browser per chat event.
+
+Measures the serialized Reflex state delta for new messages and read
+receipts at 100, 1k and 10k loaded messages, with ChatState's history
+and tail segments and with a single message list that is resent on every
+change (how `messages` used to work).
+
+Run from the repository root:
+    python -m scripts.bench_message_deltas [--events 500]
+"""
+
+import argparse
+import random
+
+from reflex.state import State
+from reflex.utils import format
+
+from chat_frontend.state.chat_state import ChatState
+
+SIZES = (100, 1_000, 10_000)
+
+
+def make_state():
+    """A standalone root state and its ChatState, outside any app or event."""
+    root = State(_reflex_internal_init=True)
+    return root, root.get_substate(ChatState.get_full_name().split(".")[1:])
+
+
+def make_message(message_id: int) -> dict:
+    return {
+        "id": message_id,
+        "content": f"message {message_id}",
+        "user": "ann",
+        "user_id": 1,
+        "timestamp": "2026-01-01T00:00:00",
+        "is_read": False,
+        "attachment_url": None,
+        "status": "sent",
+    }
+
+
+def delta_bytes(root: State) -> int:
+    """Size of the delta the next event would push, then mark the state clean."""
+    size = len(format.json_dumps(root.get_delta()))
+    root._clean()
+    return size
+
+
+def segmented(size: int, events):
+    """Current ChatState: appends and receipts go to the small segments."""
+    root, state = make_state()
+    state._set_messages([make_message(i) for i in range(size)])
+    delta_bytes(root)
+    
+    sent = []
+    next_id = size
+    for kind, message_id in events:
+        if kind == "message":
+            state._append_message(make_message(next_id))
+            next_id += 1
+        else:
+            state._update_message(message_id, {"is_read": True})
+        sent.append(delta_bytes(root))
+    return sent
+
+
+def single_list(size: int, events):
+    """One list var: every change resends all loaded messages."""
+    root, state = make_state()
+    state._set_messages([make_message(i) for i in range(size)])
+    delta_bytes(root)
+    
+    sent = []
+    next_id = size
+    for kind, message_id in events:
+        if kind == "message":
+            state.message_history.append(make_message(next_id))
+            next_id += 1
+        else:
+            state.message_history = [
+                {**msg, "is_read": True} if msg["id"] == message_id else msg
+                for msg in state.message_history
+            ]
+        sent.append(delta_bytes(root))
+    return sent
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--events", type=int, default=500)
+    args = parser.parse_args()
+    
+    print(f"{'messages':>9} {'mode':<12} {'mean B/event':>13} {'max B/event':>12}")
+    for size in SIZES:
+        rng = random.Random(size)
+        # Mostly new messages, some receipts for older ones
+        events = [
+            ("message", None) if rng.random() < 0.8 else ("read", rng.randrange(size))
+            for _ in range(args.events)
+        ]
+        for mode, run in (("segmented", segmented), ("single list", single_list)):
+            sent = run(size, events)
+            print(f"{size:>9} {mode:<12} {sum(sent) / len(sent):>13.0f} {max(sent):>12}")
+
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -0,0 +1,103 @@
+"""
+Benchmark: id-indexed message updates vs rebuilding the message list.
+
+Applies read receipts and send reconciliations (temp id -> server id) to
+a room with 10k loaded messages, once through ChatState's id index and
+once the way the handlers used to do it, rebuilding the whole list with
+a comprehension per event.
+
+Run from the repository root:
+    python -m scripts.bench_message_index [--messages 10000] [--events 200]
+"""
+
+import argparse
+import random
+import statistics
+import time
+
+from reflex.state import State
+
+from chat_frontend.state.chat_state import ChatState
+
+
+def make_state() -> ChatState:
+    """A standalone ChatState, outside any app or event."""
+    root = State(_reflex_internal_init=True)
+    return root.get_substate(ChatState.get_full_name().split(".")[1:])
+
+
+def make_messages(count: int):
+    return [
+        {
+            "id": i,
+            "content": f"message {i}",
+            "user": "ann",
+            "user_id": 1,
+            "timestamp": "2026-01-01T00:00:00",
+            "is_read": False,
+            "attachment_url": None,
+            "status": "sent",
+        }
+        for i in range(count)
+    ]
+
+
+def indexed(state: ChatState, events):
+    """Current handlers: one lookup, one entry updated in place."""
+    timings = []
+    for kind, message_id in events:
+        started = time.perf_counter()
+        if kind == "read":
+            state._update_message(message_id, {"is_read": True})
+        else:
+            state._update_message(message_id, {"id": f"{message_id}-sent", "status": "sent"})
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+def rebuild(state: ChatState, events):
+    """Previous handlers: the whole list rebuilt for every event."""
+    timings = []
+    for kind, message_id in events:
+        started = time.perf_counter()
+        if kind == "read":
+            state.message_history = [
+                {**msg, "is_read": True} if msg["id"] == message_id else msg
+                for msg in state.message_history
+            ]
+        else:
+            state.message_history = [
+                {**msg, "id": f"{message_id}-sent", "status": "sent"} if msg["id"] == message_id else msg
+                for msg in state.message_history
+            ]
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+def report(name: str, timings):
+    micros = sorted(t * 1e6 for t in timings)
+    p99 = micros[int(len(micros) * 0.99) - 1]
+    print(f"{name:<10} median {statistics.median(micros):>10.1f} us   p99 {p99:>10.1f} us")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--messages", type=int, default=10_000)
+    parser.add_argument("--events", type=int, default=200)
+    args = parser.parse_args()
+    
+    rng = random.Random(0)
+    # Receipts hit any loaded message; reconciliations hit distinct ones
+    events = [("read", rng.randrange(args.messages)) for _ in range(args.events // 2)]
+    events += [("sent", i) for i in rng.sample(range(args.messages), args.events // 2)]
+    rng.shuffle(events)
+    
+    print(f"{args.messages} loaded messages, {len(events)} events (receipts and reconciliations)")
+    for name, run in (("indexed", indexed), ("rebuild", rebuild)):
+        state = make_state()
+        state._set_messages(make_messages(args.messages))
+        report(name, run(state, events))
+
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
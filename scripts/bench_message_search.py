@@ -0,0 +1,87 @@
+"""
+Benchmark: message search index build and query latency at 100k messages.
+
+Builds a TextIndex over synthetic chat messages (Zipf-distributed words),
+then times incremental adds as new messages arrive and queries of the
+kinds typed into the in-room search: a common word, a rare word, a short
+prefix while typing, and multi-word queries.
+
+Run from the repository root:
+    python -m scripts.bench_message_search [--messages 100000] [--repeat 50]
+"""
+
+import argparse
+import itertools
+import random
+import statistics
+import string
+import time
+
+from chat_frontend.services.search_index import TextIndex, highlight
+
+QUERIES = {
+    "common word": "w0",
+    "rare word": "w4000",
+    "1-char prefix": "w",
+    "3-char prefix": "w12",
+    "two words": "w1 w2",
+    "word + prefix": "w3 w4",
+}
+
+
+def make_messages(count: int, rng: random.Random):
+    vocabulary = [f"w{i}" for i in range(5_000)] + [
+        "".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(3, 10)))
+        for _ in range(20_000)
+    ]
+    cum_weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(vocabulary))))
+    return [
+        (str(i), " ".join(rng.choices(vocabulary, cum_weights=cum_weights, k=rng.randint(3, 25))))
+        for i in range(count)
+    ]
+
+
+def time_calls(fn, repeat: int):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+def report(name: str, timings):
+    millis = sorted(t * 1000 for t in timings)
+    p99 = millis[max(0, int(len(millis) * 0.99) - 1)]
+    print(f"{name:<16} median {statistics.median(millis):>9.3f} ms   p99 {p99:>9.3f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--messages", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+    
+    rng = random.Random(0)
+    messages = make_messages(args.messages, rng)
+    print(f"{args.messages} messages, {sum(len(text) for _, text in messages) / 1e6:.1f} MB of text")
+    
+    index = TextIndex()
+    started = time.perf_counter()
+    index.rebuild(messages)
+    print(f"{'build':<16} {time.perf_counter() - started:>16.3f} s")
+    
+    arriving = iter(make_messages(args.repeat, random.Random(1)))
+    next_id = iter(range(args.messages, args.messages + args.repeat))
+    report("add (new msg)", time_calls(lambda: index.add(str(next(next_id)), next(arriving)[1]), args.repeat))
+    
+    texts = dict(messages)
+    for name, query in QUERIES.items():
+        report(name, time_calls(lambda: index.search(query, 50), args.repeat))
+    
+    hits = index.search("w3 w4", 50)
+    report("highlight x50", time_calls(lambda: [highlight(texts.get(key, ""), "w3 w4") for key in hits], args.repeat))
+
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -0,0 +1,251 @@
+"""
+Local stand-in for the chat API, for exercising the frontend without the backend.
+
+Implements the message history contract the frontend pages through:
+
+    GET /messages/{room_id}?limit=50&before_id=...
+
+returns up to `limit` (1-200) messages with an id below `before_id`,
+oldest first; without `before_id` it returns the latest page. A page
+shorter than `limit` means there is no older history. Invalid
+parameters get a 422, unknown rooms a 404.
+
+Also serves what the chat page needs around it: /auth/login (any
+username and password), /auth/refresh, /users/me, /users/, /rooms/mine,
+POST /messages/room (idempotent per client_id), POST /messages/{id}/read
+and GET /messages/search. Everything is kept in memory. Tokens are
+unsigned JWTs with `sub` and `exp` claims, enough for the client's
+expiry checks.
+
+Run from the repository root, with API_URL pointing at it:
+    python -m scripts.stand_in_api [--port 8020] [--messages 5000]
+"""
+
+import argparse
+import base64
+import itertools
+import json
+import re
+import secrets
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+PAGE_LIMIT_MAX = 200
+TOKEN_TTL = 15 * 60
+
+ROOMS = {1: "general", 2: "random", 3: "engineering"}
+
+
+def make_token(user_id: int, kind: str) -> str:
+    def encode(data: dict) -> str:
+        return base64.urlsafe_b64encode(json.dumps(data).encode()).decode().rstrip("=")
+    
+    claims = {"sub": str(user_id), "type": kind, "exp": int(time.time()) + TOKEN_TTL, "jti": secrets.token_hex(8)}
+    return f"{encode({'alg': 'none', 'typ': 'JWT'})}.{encode(claims)}.stand-in"
+
+
+class Store:
+    """In-memory users, rooms and messages."""
+    
+    def __init__(self, messages_per_room: int):
+        self.lock = threading.Lock()
+        self.users = {}
+        self.tokens = {}
+        self.messages = {room_id: [] for room_id in ROOMS}
+        self.by_client_id = {}
+        self.ids = itertools.count(1)
+        
+        seed = self.user("seed")
+        for n in range(messages_per_room):
+            for room_id in ROOMS:
+                self.post(seed, room_id, f"{ROOMS[room_id]} message {n + 1}")
+    
+    def user(self, username: str) -> dict:
+        for user in self.users.values():
+            if user["username"] == username:
+                return user
+        user_id = len(self.users) + 1
+        self.users[user_id] = {"id": user_id, "username": username, "bio": "", "avatar_url": None}
+        return self.users[user_id]
+    
+    def issue(self, user: dict) -> dict:
+        tokens = {
+            "access_token": make_token(user["id"], "access"),
+            "refresh_token": make_token(user["id"], "refresh"),
+            "token_type": "bearer",
+        }
+        self.tokens[tokens["access_token"]] = ("access", user["id"])
+        self.tokens[tokens["refresh_token"]] = ("refresh", user["id"])
+        return tokens
+    
+    def post(self, user: dict, room_id: int, content: str, client_id=None) -> dict:
+        if client_id and client_id in self.by_client_id:
+            return self.by_client_id[client_id]
+        message = {
+            "id": next(self.ids),
+            "room_id": room_id,
+            "content": content,
+            "user": user["username"],
+            "user_id": user["id"],
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "is_read": False,
+            "attachment_url": None,
+        }
+        self.messages[room_id].append(message)
+        if client_id:
+            self.by_client_id[client_id] = message
+        return message
+    
+    def page(self, room_id: int, limit: int, before_id=None) -> list:
+        """Up to `limit` messages older than `before_id`, oldest first."""
+        messages = self.messages[room_id]
+        end = len(messages)
+        if before_id is not None:
+            # Ids increase with position, so the cursor is a binary search
+            lo, hi = 0, len(messages)
+            while lo < hi:
+                mid = (lo + hi) // 2
+                if messages[mid]["id"] < before_id:
+                    lo = mid + 1
+                else:
+                    hi = mid
+            end = lo
+        return messages[max(0, end - limit):end]
+
+
+class Handler(BaseHTTPRequestHandler):
+    store: Store
+    
+    def do_GET(self):
+        self.route("GET")
+    
+    def do_POST(self):
+        self.route("POST")
+    
+    def do_PUT(self):
+        self.route("PUT")
+    
+    def route(self, method: str):
+        url = urlparse(self.path)
+        self.query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        path = url.path
+        
+        with self.store.lock:
+            if method == "POST" and path == "/auth/login":
+                body = self.body()
+                if not body.get("username"):
+                    return self.send(422, {"detail": "username is required"})
+                return self.send(200, self.store.issue(self.store.user(body["username"])))
+            if method == "POST" and path == "/auth/refresh":
+                kind, user_id = self.store.tokens.get(self.body().get("refresh_token"), (None, None))
+                if kind != "refresh":
+                    return self.send(401, {"detail": "Invalid refresh token"})
+                return self.send(200, self.store.issue(self.store.users[user_id]))
+            
+            user = self.authenticate()
+            if user is None:
+                return self.send(401, {"detail": "Not authenticated"})
+            
+            if method == "GET" and path == "/users/me":
+                return self.send(200, user)
+            if method == "PUT" and path == "/users/me":
+                user["bio"] = self.body().get("bio", user["bio"])
+                return self.send(200, user)
+            if method == "GET" and path == "/users/":
+                return self.send(200, list(self.store.users.values()))
+            if method == "GET" and path == "/rooms/mine":
+                return self.send(200, [
+                    {
+                        "id": room_id,
+                        "name": name,
+                        "last_message": (self.store.messages[room_id] or [{}])[-1].get("content"),
+                        "unread_count": 0,
+                    }
+                    for room_id, name in ROOMS.items()
+                ])
+            if method == "GET" and path == "/messages/search":
+                return self.search()
+            if method == "POST" and path == "/messages/room":
+                body = self.body()
+                if body.get("room_id") not in ROOMS or not body.get("content"):
+                    return self.send(422, {"detail": "room_id and content are required"})
+                return self.send(200, self.store.post(user, body["room_id"], body["content"], body.get("client_id")))
+            
+            match = re.fullmatch(r"/messages/(\d+)/read", path)
+            if method == "POST" and match:
+                return self.send(200, {"ok": True})
+            match = re.fullmatch(r"/messages/(\d+)", path)
+            if method == "GET" and match:
+                return self.history(int(match.group(1)))
+        
+        self.send(404, {"detail": "Not found"})
+    
+    def history(self, room_id: int):
+        if room_id not in ROOMS:
+            return self.send(404, {"detail": "Room not found"})
+        try:
+            limit = int(self.query.get("limit", 50))
+            before_id = self.query.get("before_id")
+            before_id = int(before_id) if before_id is not None else None
+        except ValueError:
+            return self.send(422, {"detail": "limit and before_id must be integers"})
+        if not 1 <= limit <= PAGE_LIMIT_MAX:
+            return self.send(422, {"detail": f"limit must be between 1 and {PAGE_LIMIT_MAX}"})
+        self.send(200, self.store.page(room_id, limit, before_id))
+    
+    def search(self):
+        query = self.query.get("query", "").casefold()
+        try:
+            room_ids = [int(self.query["room_id"])] if "room_id" in self.query else list(ROOMS)
+            limit = int(self.query.get("limit", 50))
+        except ValueError:
+            return self.send(422, {"detail": "room_id and limit must be integers"})
+        found = []
+        for room_id in room_ids:
+            found += [m for m in self.store.messages.get(room_id, []) if query and query in m["content"].casefold()]
+        found.sort(key=lambda m: m["id"], reverse=True)
+        self.send(200, found[:limit])
+    
+    def authenticate(self):
+        header = self.headers.get("Authorization", "")
+        kind, user_id = self.store.tokens.get(header.removeprefix("Bearer "), (None, None))
+        return self.store.users.get(user_id) if kind == "access" else None
+    
+    def body(self) -> dict:
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            data = json.loads(self.rfile.read(length) or b"{}")
+        except json.JSONDecodeError:
+            return {}
+        return data if isinstance(data, dict) else {}
+    
+    def send(self, status: int, data):
+        payload = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8020)
+    parser.add_argument("--messages", type=int, default=5_000, help="Seeded messages per room")
+    args = parser.parse_args()
+    
+    Handler.store = Store(args.messages)
+    server = ThreadingHTTPServer((args.host, args.port), Handler)
+    print(f"Stand-in API on http://{args.host}:{args.port} ({len(ROOMS)} rooms, {args.messages} messages each)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
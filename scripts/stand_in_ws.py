@@ -0,0 +1,171 @@
+"""
+Local stand-in for the chat WebSocket server, for exercising the frontend without the backend.
+
+Speaks both connection modes the frontend uses:
+
+- Per room: `/ws?token=...&room={room_name}` receives that room's events.
+- Multiplexed (WS_MULTIPLEX / WS_HUB): `/ws?token=...` starts with no
+  rooms and joins or leaves them with control frames:
+
+      {"type": "subscribe", "room_id": 1, "room": "general"}
+      {"type": "unsubscribe", "room_id": 1, "room": "general"}
+
+Every event carries its `room_id`. A "message" frame from a client is
+stamped with an id and timestamp and sent to every socket in the room,
+the sender included, so the echo (with the sender's `client_id`) acks
+the send. "typing" frames go to the room's other sockets. Both are
+accepted for any room, subscribed or not, since the hub sends over a
+separate per-user socket. With `--chatter N` a bot posts to a random
+room every N seconds, which shows unread counts of background rooms
+updating.
+
+The user is read from the token's unverified `sub` claim, so tokens from
+scripts/stand_in_api.py work. Messages sent here are not stored in the
+stand-in API.
+
+Run from the repository root, with WS_URL pointing at it:
+    python -m scripts.stand_in_ws [--port 8021] [--chatter 5]
+"""
+
+import argparse
+import asyncio
+import base64
+import itertools
+import json
+import random
+from datetime import datetime, timezone
+from urllib.parse import parse_qs, urlparse
+
+from websockets.asyncio.server import ServerConnection, broadcast, serve
+from websockets.exceptions import ConnectionClosed
+
+ROOMS = {1: "general", 2: "random", 3: "engineering"}
+
+# room id -> sockets receiving its events
+members = {room_id: set() for room_id in ROOMS}
+message_ids = itertools.count(1_000_000)
+
+
+def claims(token: str) -> dict:
+    """Unverified JWT payload, empty if the token is not a JWT."""
+    try:
+        payload = token.split(".")[1]
+        return json.loads(base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4)))
+    except Exception:
+        return {}
+
+
+def room_id_for(name: str) -> int:
+    for room_id, room_name in ROOMS.items():
+        if room_name == name:
+            return room_id
+    room_id = max(ROOMS) + 1
+    ROOMS[room_id] = name
+    members[room_id] = set()
+    return room_id
+
+
+def publish(room_id: int, event: dict, exclude=None):
+    sockets = [ws for ws in members.get(room_id, ()) if ws is not exclude]
+    broadcast(sockets, json.dumps({**event, "room_id": room_id}))
+
+
+def new_message(room_id: int, user: str, user_id: int, content: str, client_id=None) -> dict:
+    event = {
+        "type": "message",
+        "id": next(message_ids),
+        "content": content,
+        "user": user,
+        "user_id": user_id,
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "is_read": False,
+    }
+    if client_id is not None:
+        event["client_id"] = client_id
+    publish(room_id, event)
+    return event
+
+
+async def handler(ws: ServerConnection):
+    query = parse_qs(urlparse(ws.request.path).query)
+    token = query.get("token", [""])[-1]
+    subject = claims(token).get("sub")
+    if subject is None:
+        await ws.close(4401, "Invalid token")
+        return
+    user_id = int(subject) if str(subject).isdigit() else subject
+    user = claims(token).get("username") or f"user-{subject}"
+    
+    rooms = set()
+    if "room" in query:
+        rooms.add(room_id_for(query["room"][-1]))
+    for room_id in rooms:
+        members[room_id].add(ws)
+    print(f"{user} connected ({'room ' + query['room'][-1] if rooms else 'multiplexed'})")
+    
+    try:
+        async for raw in ws:
+            try:
+                frame = json.loads(raw)
+            except json.JSONDecodeError:
+                continue
+            kind = frame.get("type")
+            room_id = frame.get("room_id")
+            if room_id is None and len(rooms) == 1:
+                # Per-room sockets may leave the room implicit
+                room_id = next(iter(rooms))
+            
+            if kind == "subscribe" and room_id is not None:
+                if room_id not in members:
+                    room_id = room_id_for(frame.get("room") or f"room-{room_id}")
+                rooms.add(room_id)
+                members[room_id].add(ws)
+            elif kind == "unsubscribe":
+                rooms.discard(room_id)
+                members.get(room_id, set()).discard(ws)
+            elif kind == "message" and room_id in members and frame.get("content"):
+                new_message(room_id, user, user_id, frame["content"], frame.get("client_id"))
+            elif kind == "typing" and room_id in members:
+                publish(
+                    room_id,
+                    {"type": "typing", "user": user, "is_typing": frame.get("is_typing", True)},
+                    exclude=ws,
+                )
+    except ConnectionClosed:
+        pass
+    finally:
+        for room_id in rooms:
+            members[room_id].discard(ws)
+        print(f"{user} disconnected")
+
+
+async def chatter(interval: float):
+    """Post as a bot to a random room every `interval` seconds."""
+    for n in itertools.count(1):
+        await asyncio.sleep(interval)
+        room_id = random.choice(list(ROOMS))
+        new_message(room_id, "bot", 0, f"bot message {n} in {ROOMS[room_id]}")
+
+
+async def run(host: str, port: int, chatter_interval: float):
+    async with serve(handler, host, port) as server:
+        print(f"Stand-in WebSocket server on ws://{host}:{port}/ws")
+        if chatter_interval > 0:
+            asyncio.create_task(chatter(chatter_interval))
+        await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8021)
+    parser.add_argument("--chatter", type=float, default=0, help="Seconds between bot messages (0: off)")
+    args = parser.parse_args()
+    try:
+        asyncio.run(run(args.host, args.port, args.chatter))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -0,0 +1,44 @@
+"""Fixtures for tests against the stand-in servers in scripts/."""
+
+import asyncio
+import os
+import tempfile
+import threading
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+# Keep the tests' message outbox out of the working tree
+os.environ.setdefault("OUTBOX_PATH", os.path.join(tempfile.mkdtemp(), "outbox.sqlite3"))
+
+from chat_frontend.services.http_client import close_http_client
+from scripts import stand_in_api
+
+# Seeded messages per room: two full pages and a short third one
+STAND_IN_MESSAGES = 120
+
+
+@pytest.fixture
+def run():
+    """Run a coroutine on a fresh event loop, closing the shared HTTP client after."""
+    async def wrapped(coro):
+        try:
+            return await coro
+        finally:
+            await close_http_client()
+    
+    return lambda coro: asyncio.run(wrapped(coro))
+
+
+@pytest.fixture
+def api_url(monkeypatch):
+    """Base URL of a stand-in API running in a thread, which the state talks to."""
+    stand_in_api.Handler.store = stand_in_api.Store(STAND_IN_MESSAGES)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), stand_in_api.Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    url = f"http://127.0.0.1:{server.server_address[1]}"
+    monkeypatch.setattr("chat_frontend.state.base_state.API_URL", url)
+    yield url
+    server.shutdown()
+    server.server_close()
\ No newline at end of file
@@ -0,0 +1,113 @@
+"""History paging (before_id/limit) against scripts/stand_in_api.py."""
+
+import httpx
+import pytest
+from reflex.state import State
+
+from chat_frontend.state.chat_state import FIRST_MESSAGE_INDEX, MESSAGE_PAGE_SIZE, ChatState
+from conftest import STAND_IN_MESSAGES
+from scripts import stand_in_api
+
+ROOM_ID = 1
+
+
+@pytest.fixture
+def chat(api_url):
+    """A signed-in ChatState with room 1 open and nothing loaded yet."""
+    tokens = httpx.post(f"{api_url}/auth/login", json={"username": "alice", "password": "x"}).json()
+    root = State(_reflex_internal_init=True)
+    state = root.get_substate(ChatState.get_full_name().split(".")[1:])
+    state.access_token = tokens["access_token"]
+    state.refresh_token = tokens["refresh_token"]
+    state.is_authenticated = True
+    state.current_user = httpx.get(
+        f"{api_url}/users/me", headers={"Authorization": f"Bearer {tokens['access_token']}"}
+    ).json()
+    state.current_room_id = ROOM_ID
+    return state
+
+
+def ids(state: ChatState) -> list:
+    return [msg["id"] for msg in state._loaded_messages()]
+
+
+async def drain(events):
+    """Run an event handler that yields, to completion."""
+    async for _ in events:
+        pass
+
+
+def test_first_page_is_the_latest(chat, run):
+    run(chat.load_messages(ROOM_ID))
+    
+    loaded = ids(chat)
+    assert len(loaded) == MESSAGE_PAGE_SIZE
+    assert loaded == sorted(loaded)
+    assert chat._loaded_messages()[-1]["content"] == f"general message {STAND_IN_MESSAGES}"
+    assert chat.has_more_messages
+
+
+def test_older_pages_continue_from_the_oldest_loaded(chat, run):
+    async def scenario():
+        await chat.load_messages(ROOM_ID)
+        first = ids(chat)
+        await drain(chat.load_older_messages())
+        return first
+    
+    first = run(scenario())
+    
+    loaded = ids(chat)
+    assert len(loaded) == 2 * MESSAGE_PAGE_SIZE
+    assert loaded[MESSAGE_PAGE_SIZE:] == first
+    # Contiguous: nothing skipped or repeated at the page boundary
+    contents = [msg["content"] for msg in chat._loaded_messages()]
+    assert contents == [
+        f"general message {n}"
+        for n in range(STAND_IN_MESSAGES - 2 * MESSAGE_PAGE_SIZE + 1, STAND_IN_MESSAGES + 1)
+    ]
+    assert chat.first_message_index == FIRST_MESSAGE_INDEX - MESSAGE_PAGE_SIZE
+    assert chat.has_more_messages
+    assert not chat.loading_older_messages
+
+
+def test_short_page_ends_history(chat, run):
+    async def scenario():
+        await chat.load_messages(ROOM_ID)
+        while chat.has_more_messages:
+            await drain(chat.load_older_messages())
+        # Further requests are no-ops
+        await drain(chat.load_older_messages())
+    
+    run(scenario())
+    
+    assert len(ids(chat)) == STAND_IN_MESSAGES
+    assert chat._loaded_messages()[0]["content"] == "general message 1"
+    assert not chat.has_more_messages
+
+
+def test_jump_to_message_loads_pages_until_found(chat, run):
+    # The room's oldest message, two pages before the latest one
+    target = stand_in_api.Handler.store.messages[ROOM_ID][0]["id"]
+    
+    async def scenario():
+        await chat.load_messages(ROOM_ID)
+        await drain(chat.jump_to_message(str(target)))
+    
+    run(scenario())
+    
+    assert chat._message_position(target) is not None
+    assert chat.highlighted_message_id == str(target)
+    assert not chat.loading_older_messages
+
+
+def test_invalid_cursor_keeps_loaded_messages(chat, run):
+    # A loaded message whose id the server cannot use as a cursor
+    chat._set_messages([{"id": "not-a-number", "content": "odd", "user": "x", "user_id": 0}])
+    chat.has_more_messages = True
+    
+    run(drain(chat.load_older_messages()))
+    
+    assert ids(chat) == ["not-a-number"]
+    assert chat.has_more_messages
+    assert not chat.loading_older_messages
+    assert chat.error_message
\ No newline at end of file
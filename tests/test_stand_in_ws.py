@@ -0,0 +1,155 @@
+"""Room subscriptions on the multiplexed socket against scripts/stand_in_ws.py."""
+
+import asyncio
+import json
+
+import pytest
+from reflex.state import State
+from websockets.asyncio.client import connect
+from websockets.asyncio.server import serve
+
+from chat_frontend.state.ws_state import WebSocketState
+from scripts import stand_in_api, stand_in_ws
+
+ROOMS = [(room_id, name) for room_id, name in stand_in_ws.ROOMS.items()]
+
+# Seconds to wait for frames that should (or should not) arrive
+SETTLE = 0.3
+
+
+class Frames(list):
+    """Frames passed to the state's message callback."""
+    
+    async def append_async(self, frame):
+        self.append(frame)
+    
+    def rooms(self) -> set:
+        return {frame["room_id"] for frame in self if frame.get("type") == "message"}
+
+
+@pytest.fixture
+def ws_state(monkeypatch):
+    """A WebSocketState that opens its own socket rather than using the hub."""
+    monkeypatch.setattr("chat_frontend.state.ws_state.WS_HUB", False)
+    root = State(_reflex_internal_init=True)
+    return root.get_substate(WebSocketState.get_full_name().split(".")[1:])
+
+
+async def stand_in(monkeypatch):
+    """Start the WebSocket stand-in on a free port and point the state at it."""
+    server = await serve(stand_in_ws.handler, "127.0.0.1", 0)
+    url = f"ws://127.0.0.1:{server.sockets[0].getsockname()[1]}"
+    monkeypatch.setattr("chat_frontend.state.ws_state.WS_URL", url)
+    return server, url
+
+
+async def connected(state: WebSocketState, received: list):
+    """Open the state's multiplexed socket and record the frames it sends."""
+    await state.connect_multiplexed(stand_in_api.make_token(1, "access"), received.append_async)
+    sent = []
+    send = state._ws.send
+    
+    async def recording_send(message):
+        sent.append(json.loads(message))
+        await send(message)
+    
+    state._ws.send = recording_send
+    return sent
+
+
+async def wait_for_members(room_ids, present: bool):
+    """Wait until the server has (or no longer has) a member in each room."""
+    for _ in range(100):
+        if all(bool(stand_in_ws.members[room_id]) == present for room_id in room_ids):
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError(f"rooms {room_ids} membership did not become {present}")
+
+
+async def post_to_every_room(url: str):
+    """Post one message to each room from another user's socket."""
+    async with connect(f"{url}/ws?token={stand_in_api.make_token(2, 'access')}") as poster:
+        for room_id, name in ROOMS:
+            await poster.send(json.dumps({"type": "message", "room_id": room_id, "content": f"hi {name}"}))
+        await asyncio.sleep(SETTLE)
+
+
+def test_only_subscribed_rooms_are_received(ws_state, monkeypatch, run):
+    async def scenario():
+        server, url = await stand_in(monkeypatch)
+        received = Frames()
+        try:
+            await connected(ws_state, received)
+            await ws_state.subscribe([ROOMS[0], ROOMS[1]])
+            await wait_for_members([ROOMS[0][0], ROOMS[1][0]], present=True)
+            await post_to_every_room(url)
+        finally:
+            await ws_state.disconnect()
+            server.close()
+            await server.wait_closed()
+        return received
+    
+    received = run(scenario())
+    
+    assert received.rooms() == {ROOMS[0][0], ROOMS[1][0]}
+
+
+def test_unsubscribe_stops_a_rooms_events(ws_state, monkeypatch, run):
+    async def scenario():
+        server, url = await stand_in(monkeypatch)
+        received = Frames()
+        try:
+            await connected(ws_state, received)
+            await ws_state.subscribe(ROOMS)
+            await wait_for_members([room_id for room_id, _ in ROOMS], present=True)
+            await ws_state.unsubscribe([ROOMS[0][0]])
+            await wait_for_members([ROOMS[0][0]], present=False)
+            await post_to_every_room(url)
+        finally:
+            await ws_state.disconnect()
+            server.close()
+            await server.wait_closed()
+        return received
+    
+    received = run(scenario())
+    
+    assert received.rooms() == {room_id for room_id, _ in ROOMS[1:]}
+
+
+def test_set_subscriptions_sends_only_the_difference(ws_state, monkeypatch, run):
+    async def scenario():
+        server, url = await stand_in(monkeypatch)
+        received = Frames()
+        try:
+            sent = await connected(ws_state, received)
+            await ws_state.set_subscriptions([ROOMS[0], ROOMS[1]])
+            first = list(sent)
+            sent.clear()
+            
+            # Keep room 2, leave room 1, join room 3
+            await ws_state.set_subscriptions([ROOMS[1], ROOMS[2]])
+            second = list(sent)
+            sent.clear()
+            
+            # Unchanged: nothing to send
+            await ws_state.set_subscriptions([ROOMS[2], ROOMS[1]])
+            third = list(sent)
+            
+            await wait_for_members([ROOMS[1][0], ROOMS[2][0]], present=True)
+            await wait_for_members([ROOMS[0][0]], present=False)
+            await post_to_every_room(url)
+            rooms = dict(ws_state._rooms)
+        finally:
+            await ws_state.disconnect()
+            server.close()
+            await server.wait_closed()
+        return first, second, third, rooms, received
+    
+    first, second, third, rooms, received = run(scenario())
+    
+    frames = lambda sent: sorted((frame["type"], frame["room_id"]) for frame in sent)
+    assert frames(first) == [("subscribe", ROOMS[0][0]), ("subscribe", ROOMS[1][0])]
+    assert frames(second) == [("subscribe", ROOMS[2][0]), ("unsubscribe", ROOMS[0][0])]
+    assert third == []
+    assert rooms == dict(ROOMS[1:])
+    assert received.rooms() == {ROOMS[1][0], ROOMS[2][0]}
\ No newline at end of file